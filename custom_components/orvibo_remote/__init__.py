@@ -3,6 +3,9 @@ import asyncio
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
 
+from .const import DATA_ENTRY_SESSIONS, DOMAIN
+
+# SmartSwitches are configured in YAML only, config entries carry no switches
 PLATFORMS = ["remote"]
 
 
@@ -17,7 +20,12 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
-    """Unload a config entry."""
+    """Unload a config entry.
+
+    Only entities are unloaded, device sessions with their sockets,
+    discovered devices and code caches stay in hass.data, so reload neither
+    rediscovers nor reconnects.
+    """
     return all(
         await asyncio.gather(
             *[
@@ -26,3 +34,13 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry):
             ]
         )
     )
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Close device sockets of removed config entry.
+
+    Sessions stay shared, if other remotes use the device they reconnect.
+    """
+    entry_sessions = hass.data.get(DOMAIN, {}).get(DATA_ENTRY_SESSIONS, {})
+    for session in entry_sessions.pop(entry.entry_id, []):
+        await hass.async_add_executor_job(session.close)
@@ -0,0 +1,32 @@
+"""Cache of decoded IR commands."""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Callable, Optional
+
+MAX_CODES = 256
+
+
+class CodeCache:
+    """Least recently used cache of decoded commands."""
+
+    def __init__(self, max_codes: int = MAX_CODES) -> None:
+        self._max_codes = max_codes
+        self._codes: OrderedDict[str, bytes] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def __contains__(self, command: str) -> bool:
+        return command in self._codes
+
+    def get(self, command: str, decode: Callable[[str], bytes]) -> bytes:
+        """Return decoded command, decoding and caching it on a miss."""
+        code: Optional[bytes] = self._codes.get(command)
+        if code is None:
+            code = self._codes[command] = decode(command)
+            if len(self._codes) > self._max_codes:
+                self._codes.popitem(last=False)
+        else:
+            self._codes.move_to_end(command)
+        return code
@@ -0,0 +1,163 @@
+"""Read-only memory-mapped IR code database.
+
+Large code sets are not loaded into memory: database file is memory-mapped
+and codes are found by binary search over a sorted index.
+
+File layout:
+    header  -- MAGIC, number of codes, index offset
+    data    -- keys and raw IR codes one after another
+    index   -- (key offset, key length, code offset, code length) per code,
+               sorted by key
+
+Key is "brand\\0model\\0function" in lower case.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import sys
+from base64 import b64decode
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+MAGIC = b"ORVDB1"
+
+_HEADER = struct.Struct("<6sIQ")
+_ENTRY = struct.Struct("<QHQI")
+
+SEPARATOR = b"\x00"
+
+
+def _key(*parts: str) -> bytes:
+    return SEPARATOR.join(part.strip().lower().encode() for part in parts)
+
+
+class CodeDatabase:
+    """Memory-mapped IR code database, lookups are O(log n)."""
+
+    def __init__(self, path: str) -> None:
+        """Map database file.
+
+        raises -- ValueError if file is not a database or is truncated
+        """
+        self.path = path
+        with open(path, "rb") as f:
+            # Empty file can't be mapped, mmap raises ValueError itself
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        try:
+            if len(self._mmap) < _HEADER.size:
+                raise ValueError("{} is not an IR code database".format(path))
+            magic, self._count, self._index_offset = _HEADER.unpack_from(self._mmap)
+            if magic != MAGIC:
+                raise ValueError("{} is not an IR code database".format(path))
+            if self._index_offset + self._count * _ENTRY.size > len(self._mmap):
+                raise ValueError("{} is truncated".format(path))
+        except ValueError:
+            self._mmap.close()
+            raise
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __enter__(self) -> CodeDatabase:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._mmap.close()
+
+    def _entry(self, indx: int) -> Tuple[int, int, int, int]:
+        key_offset, key_length, code_offset, code_length = _ENTRY.unpack_from(
+            self._mmap, self._index_offset + indx * _ENTRY.size
+        )
+        return key_offset, key_length, code_offset, code_length
+
+    def _key_at(self, indx: int) -> bytes:
+        key_offset, key_length, _, _ = self._entry(indx)
+        return self._mmap[key_offset : key_offset + key_length]
+
+    def _lower_bound(self, key: bytes) -> int:
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def get(self, brand: str, model: str, function: str) -> Optional[bytes]:
+        """Return raw IR code, None if there is no such code."""
+        key = _key(brand, model, function)
+        indx = self._lower_bound(key)
+        if indx == self._count or self._key_at(indx) != key:
+            return None
+
+        _, _, code_offset, code_length = self._entry(indx)
+        return self._mmap[code_offset : code_offset + code_length]
+
+    def keys(self, *prefix: str) -> Iterator[Tuple[str, ...]]:
+        """Iterate over (brand, model, function) of codes starting with prefix.
+
+        E.g. keys("samsung") lists all Samsung codes, keys("samsung", "tv")
+        all functions of the Samsung TV model.
+        """
+        key = _key(*prefix) + SEPARATOR if prefix else b""
+        for indx in range(self._lower_bound(key), self._count):
+            found = self._key_at(indx)
+            if not found.startswith(key):
+                break
+            yield tuple(part.decode() for part in found.split(SEPARATOR))
+
+
+def build_code_database(path: str, codes: Iterable[Tuple[str, str, str, bytes]]) -> int:
+    """Write database of (brand, model, function, raw IR code) entries.
+
+    returns -- number of stored codes
+    """
+    entries = sorted(
+        {
+            _key(brand, model, function): code for brand, model, function, code in codes
+        }.items()
+    )
+
+    with open(path, "wb") as f:
+        f.write(b"\x00" * _HEADER.size)
+
+        index: List[bytes] = []
+        for key, code in entries:
+            key_offset = f.tell()
+            f.write(key)
+            code_offset = f.tell()
+            f.write(code)
+            index.append(_ENTRY.pack(key_offset, len(key), code_offset, len(code)))
+
+        index_offset = f.tell()
+        f.write(b"".join(index))
+        f.seek(0)
+        f.write(_HEADER.pack(MAGIC, len(entries), index_offset))
+
+    return len(entries)
+
+
+def _json_codes(path: str) -> Iterator[Tuple[str, str, str, bytes]]:
+    """Read {brand: {model: {function: "b64:..."}}} JSON code set."""
+    with open(path) as f:
+        brands = json.load(f)
+
+    for brand, models in brands.items():
+        for model, functions in models.items():
+            for function, code in functions.items():
+                yield brand, model, function, b64decode(code.replace("b64:", ""))
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("codedb.py <codes.json> <codes.db>")
+        sys.exit(2)
+
+    count = build_code_database(sys.argv[2], _json_codes(sys.argv[1]))
+    print("Stored {} codes".format(count))
@@ -0,0 +1,39 @@
+"""Constants for the Orvibo AllOne remote integration."""
+
+DOMAIN = "orvibo_remote"
+
+CONF_BRIDGE = "bridge"
+CONF_CODE_DATABASE = "code_database"
+CONF_DISCOVERY_SUBNETS = "discovery_subnets"
+CONF_DISCOVERY_WORKERS = "discovery_workers"
+CONF_GROUP = "group"
+CONF_KEY = "key"
+CONF_POWER_OFF = "power_off"
+CONF_POWER_ON = "power_on"
+CONF_POWER_TOGGLE = "power_toggle"
+
+DATA_BRIDGES = "bridges"
+DATA_CODE_CACHE = "code_cache"
+DATA_CODE_DATABASES = "code_databases"
+DATA_DEVICES = "devices"
+DATA_EMIT_RATES = "emit_rates"
+DATA_ENTRY_SESSIONS = "entry_sessions"
+DATA_LEARNED = "learned"
+DATA_PROFILE_LOCK = "profile_lock"
+DATA_RF433_KEYS = "rf433_keys"
+DATA_SESSIONS = "sessions"
+DATA_SYNC_EMITTER = "sync_emitter"
+DATA_USAGE = "usage"
+
+ATTR_DURATION = "duration"
+ATTR_MODE = "mode"
+ATTR_RATE = "rate"
+
+DEFAULT_DISCOVERY_WORKERS = 4
+DEFAULT_REPEAT_RATE = 10
+DEFAULT_REPEAT_TIMEOUT = 10
+
+SERVICE_PROFILE = "profile"
+SERVICE_SEND_SYNCHRONIZED = "send_synchronized"
+SERVICE_START_REPEAT = "start_repeat"
+SERVICE_STOP_REPEAT = "stop_repeat"
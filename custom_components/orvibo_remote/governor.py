@@ -0,0 +1,105 @@
+"""Per-device emit rate governor.
+
+AllOne units drop packets when flooded, older ones already at a few emits
+per second. Governor learns the highest rate a device handles from
+acknowledgements of streamed emits and throttles streams to it.
+"""
+from __future__ import annotations
+
+import logging
+from typing import Dict, Optional
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_EMIT_RATES, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = f"{DOMAIN}.emit_rates"
+STORAGE_VERSION = 1
+SAVE_DELAY = 60
+
+MIN_RATE = 1.0
+MAX_RATE = 50.0
+
+# Stream losing more than this share of emits was too fast for the device
+LOSS_THRESHOLD = 0.05
+# Loss free stream at the learned rate raises it by this factor
+PROBE_FACTOR = 1.1
+
+
+class EmitRates:
+    """Learned emit rates of devices, persisted in HA storage."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._rates: Optional[Dict[str, float]] = None
+
+    async def async_get(self, key: str) -> Optional[float]:
+        if self._rates is None:
+            self._rates = await self._store.async_load() or {}
+        return self._rates.get(key)
+
+    def set(self, key: str, rate: float) -> None:
+        if self._rates is not None:
+            self._rates[key] = rate
+            self._store.async_delay_save(lambda: self._rates, SAVE_DELAY)
+
+
+def get_emit_rates(hass: HomeAssistant) -> EmitRates:
+    """Return learned emit rates shared by all sessions."""
+    return hass.data.setdefault(DOMAIN, {}).setdefault(DATA_EMIT_RATES, EmitRates(hass))
+
+
+class EmitGovernor:
+    """Learns the highest emit rate the device handles without losing packets.
+
+    Rate is unknown until the device acknowledges a stream, streams are not
+    throttled till then. Stream losing more than LOSS_THRESHOLD of emits
+    lowers the rate to what got through, loss free stream at the learned
+    rate raises it by PROBE_FACTOR, so the rate keeps following the device.
+    Devices which never acknowledge emits are not throttled.
+    """
+
+    def __init__(
+        self, rates: Optional[EmitRates] = None, key: Optional[str] = None
+    ) -> None:
+        self._rates = rates
+        self._key = key
+        self._loaded = False
+        self.rate: Optional[float] = None
+
+    async def async_limit(self, rate: float) -> float:
+        """Return the rate to stream at instead of requested one."""
+        if not self._loaded:
+            if self._rates is not None and self._key is not None:
+                self.rate = await self._rates.async_get(self._key)
+            self._loaded = True
+        return rate if self.rate is None else min(rate, self.rate)
+
+    def feedback(self, rate: float, sent: int, acked: int) -> None:
+        """Learn from number of acknowledged emits of stream at given rate."""
+        if not sent or (not acked and self.rate is None):
+            return
+
+        loss = 1 - min(acked, sent) / sent
+        if loss > LOSS_THRESHOLD:
+            learned = max(MIN_RATE, rate * (1 - loss))
+        elif self.rate is None or rate >= self.rate:
+            learned = min(MAX_RATE, rate * PROBE_FACTOR)
+        else:
+            # Slower than learned rate, nothing new about the device
+            return
+
+        _LOGGER.debug(
+            "Emit rate of %s: %.1f/sec, %d of %d emits acknowledged at %.1f/sec",
+            self._key,
+            learned,
+            acked,
+            sent,
+            rate,
+        )
+        self.rate = round(learned, 2)
+        if self._rates is not None and self._key is not None:
+            self._rates.set(self._key, self.rate)
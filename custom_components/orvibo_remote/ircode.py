@@ -0,0 +1,194 @@
+"""Normalization and near-duplicate detection of learned IR signals.
+
+Learned AllOne IR signal:
+    length  -- 2 bytes little endian, number of bytes which follow
+    header  -- 14 bytes, kept as is
+    count   -- 2 bytes little endian, number of timing bytes, `length` - 16
+    timings -- 2 bytes little endian mark and space durations
+
+Anything after `length` bytes is padding or capture noise. Signals of other
+layouts, e.g. RF433, or with inconsistent lengths are left as they are.
+"""
+from __future__ import annotations
+
+import math
+import struct
+import sys
+from array import array
+from base64 import b64decode, b64encode
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_LEARNED, DOMAIN
+
+HEADER_SIZE = 18
+
+# Durations which differ by less than this share are the same duration
+TOLERANCE = 0.2
+# Canonical durations are rounded to this number of significant digits
+SIGNIFICANT_DIGITS = 2
+
+STORAGE_KEY = f"{DOMAIN}.learned"
+STORAGE_VERSION = 1
+
+_LENGTH = struct.Struct("<H")
+
+
+def _split(signal: bytes) -> Optional[Tuple[bytes, array]]:
+    """Return (header, timings) of IR signal, None if signal has other layout."""
+    if len(signal) < HEADER_SIZE:
+        return None
+
+    end = 2 + _LENGTH.unpack_from(signal)[0]
+    count = _LENGTH.unpack_from(signal, HEADER_SIZE - _LENGTH.size)[0]
+    if end > len(signal) or count != end - HEADER_SIZE or count % 2:
+        return None
+
+    timings = array("H", signal[HEADER_SIZE:end])
+    if sys.byteorder == "big":
+        timings.byteswap()
+    return signal[:HEADER_SIZE], timings
+
+
+def _round(value: float) -> int:
+    digits = len(str(int(value))) - SIGNIFICANT_DIGITS
+    return min(int(round(value, -digits)) if digits > 0 else round(value), 0xFFFF)
+
+
+def _canonical_durations(timings: array, tolerance: float) -> Dict[int, int]:
+    """Map every duration to the rounded mean of its cluster of close durations."""
+    counts = Counter(timings)
+    mapping: Dict[int, int] = {}
+    cluster: List[int] = []
+
+    def flush() -> None:
+        total = sum(counts[value] for value in cluster)
+        mean = _round(sum(value * counts[value] for value in cluster) / total)
+        for value in cluster:
+            mapping[value] = mean
+        cluster.clear()
+
+    for value in sorted(counts):
+        if cluster and value > cluster[0] * (1 + tolerance):
+            flush()
+        cluster.append(value)
+    if cluster:
+        flush()
+
+    return mapping
+
+
+def normalize(signal: bytes, tolerance: float = TOLERANCE) -> bytes:
+    """Trim padding and replace jittery durations with canonical ones.
+
+    Same button learned twice gives the same signal in most cases.
+    """
+    parts = _split(signal)
+    if parts is None:
+        return signal
+
+    header, timings = parts
+    mapping = _canonical_durations(timings, tolerance)
+    canonical = array("H", (mapping[value] for value in timings))
+    if sys.byteorder == "big":
+        canonical.byteswap()
+    return header + canonical.tobytes()
+
+
+def fingerprint(signal: bytes, tolerance: float = TOLERANCE) -> Tuple[int, ...]:
+    """Return durations of IR signal on log scale with tolerance wide steps.
+
+    Signals of other layouts are fingerprinted by their bytes.
+    """
+    parts = _split(signal)
+    if parts is None:
+        return tuple(signal)
+
+    step = math.log1p(tolerance)
+    return tuple(round(math.log(value) / step) if value else -1 for value in parts[1])
+
+
+def _is_near(timings: array, other: array, tolerance: float) -> bool:
+    return len(timings) == len(other) and all(
+        abs(a - b) <= max(a, b) * tolerance for a, b in zip(timings, other)
+    )
+
+
+class SignalIndex:
+    """Finds near duplicates of signals.
+
+    Lookup by fingerprint finds most duplicates at once, signals with the same
+    number of timings are compared one by one only if fingerprints differ.
+    """
+
+    def __init__(self, tolerance: float = TOLERANCE) -> None:
+        self._tolerance = tolerance
+        self._fingerprints: Dict[Tuple[int, ...], str] = {}
+        self._by_length: Dict[int, List[Tuple[str, array]]] = {}
+
+    def __len__(self) -> int:
+        return len(self._fingerprints)
+
+    def add(self, name: str, signal: bytes) -> None:
+        self._fingerprints.setdefault(fingerprint(signal, self._tolerance), name)
+        parts = _split(signal)
+        if parts is not None:
+            self._by_length.setdefault(len(parts[1]), []).append((name, parts[1]))
+
+    def find(self, signal: bytes) -> Optional[str]:
+        """Return name of near duplicate signal, None if there is none."""
+        name = self._fingerprints.get(fingerprint(signal, self._tolerance))
+        if name is not None:
+            return name
+
+        parts = _split(signal)
+        if parts is None:
+            return None
+
+        timings = parts[1]
+        for name, other in self._by_length.get(len(timings), []):
+            if _is_near(timings, other, self._tolerance):
+                return name
+        return None
+
+
+class LearnedCodes:
+    """Learned commands in send_command format, persisted in HA storage."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._index: Optional[SignalIndex] = None
+        self._commands: List[str] = []
+
+    async def async_load(self) -> SignalIndex:
+        if self._index is None:
+            self._commands = await self._store.async_load() or []
+            index = SignalIndex()
+            for command in self._commands:
+                index.add(command, b64decode(command[len("b64:") :]))
+            self._index = index
+        return self._index
+
+    async def async_add(self, signal: bytes) -> Tuple[str, Optional[str]]:
+        """Normalize and store learned signal.
+
+        returns -- (command, command of near duplicate learned before or None)
+        """
+        index = await self.async_load()
+        signal = normalize(signal)
+        command = "b64:" + b64encode(signal).decode()
+
+        duplicate = index.find(signal)
+        if duplicate is None:
+            index.add(command, signal)
+            self._commands.append(command)
+            await self._store.async_save(self._commands)
+        return command, duplicate
+
+
+def get_learned_codes(hass: HomeAssistant) -> LearnedCodes:
+    """Return learned codes shared by all remotes."""
+    return hass.data.setdefault(DOMAIN, {}).setdefault(DATA_LEARNED, LearnedCodes(hass))
@@ -0,0 +1,361 @@
+# @file bridge.py
+
+# Local daemon which owns the Orvibo UDP port and serves many clients.
+#
+# Only one process can comfortably bind port 10000, so the bridge does all the
+# discovery, keeps a warm session for every device and exposes small JSON API
+# over HTTP or Unix socket:
+#
+#   GET  /devices   -- {mac: {"ip": ip, "type": type}} of known devices
+#   POST /discover  -- rediscovers devices, returns the same as /devices
+#   POST /emit      -- {"mac": mac, "signal": b64} => {"ok": bool}
+#   POST /learn     -- {"mac": mac, "timeout": sec} => {"signal": b64 or null}
+#   POST /rf433     -- {"mac": mac, "on": bool, "keys": [b64]} => {"ok": bool}
+#   POST /batch     -- [{"mac", "action": "emit"|"learn"|"rf433", ...}] => [results]
+#
+# Run it with:
+#   python -m custom_components.orvibo_remote.orvibo.bridge --unix /run/orvibo.sock
+
+import argparse
+import base64
+import binascii
+import http.client
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from .capture import Recorder
+from .link import DeviceLink
+from .orvibo import Orvibo, OrviboException
+
+DEFAULT_PORT = 8710
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class Bridge:
+    """Registry of warm device sessions shared by all bridge clients."""
+
+    def __init__(self, workers=16, subnets=None):
+        self._subnets = subnets or []
+        self._workers = workers
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="orvibo-bridge"
+        )
+
+    def discover(self):
+        """Discovers devices and opens sessions for the new ones."""
+        discovered = Orvibo.discover()
+        if self._subnets:
+            discovered.update(
+                Orvibo.discover_subnets(self._subnets, workers=self._workers)
+            )
+        with self._lock:
+            for ip, mac, otype in discovered.values():
+                key = binascii.hexlify(mac).decode()
+                session = self._sessions.get(key)
+                if session is None or session.device.ip != ip:
+                    if session is not None:
+                        session.close()
+                    self._sessions[key] = DeviceLink(
+                        Orvibo(ip, mac, otype), keep_connection=True
+                    )
+        return self.devices()
+
+    def devices(self):
+        with self._lock:
+            return {
+                mac: {"ip": s.device.ip, "type": s.device.type}
+                for mac, s in self._sessions.items()
+            }
+
+    def _session(self, mac):
+        with self._lock:
+            session = self._sessions.get(mac.lower())
+        if session is None:
+            raise OrviboException("Device mac={} is not known".format(mac))
+        return session
+
+    def emit(self, mac, signal):
+        session = self._session(mac)
+        return {"ok": bool(session.run(session.device.emit_ir, signal))}
+
+    def learn(self, mac, timeout=15):
+        session = self._session(mac)
+        signal = session.run(session.device.learn, None, timeout)
+        return {
+            "signal": base64.b64encode(signal).decode() if signal is not None else None
+        }
+
+    def emit_rf433(self, mac, on, keys):
+        session = self._session(mac)
+        session.run(session.device.emit_rf433_many, on, keys)
+        return {"ok": True}
+
+    def execute(self, command):
+        """Executes single API command, errors are reported in result."""
+        if not isinstance(command, dict):
+            raise OrviboException("Command must be an object")
+
+        start_time = time.time()
+        try:
+            action = command.get("action", "emit")
+            if action == "emit":
+                result = self.emit(command["mac"], base64.b64decode(command["signal"]))
+            elif action == "learn":
+                result = self.learn(command["mac"], command.get("timeout", 15))
+            elif action == "rf433":
+                result = self.emit_rf433(
+                    command["mac"],
+                    bool(command["on"]),
+                    [base64.b64decode(key) for key in command["keys"]],
+                )
+            else:
+                raise OrviboException("Unknown action {}".format(action))
+        except (OrviboException, KeyError, ValueError, OSError) as e:
+            result = {"ok": False, "error": str(e)}
+        result["elapsed_ms"] = round((time.time() - start_time) * 1000, 3)
+        return result
+
+    def batch(self, commands):
+        """Executes commands concurrently, ordered within every device."""
+        if not isinstance(commands, list) or not all(
+            isinstance(command, dict) for command in commands
+        ):
+            raise OrviboException("Batch must be a list of command objects")
+
+        groups = {}
+        for indx, command in enumerate(commands):
+            groups.setdefault(str(command.get("mac", "")).lower(), []).append(
+                (indx, command)
+            )
+
+        def run_group(group):
+            return [(indx, self.execute(command)) for indx, command in group]
+
+        results = [None] * len(commands)
+        for future in [self._executor.submit(run_group, g) for g in groups.values()]:
+            for indx, result in future.result():
+                results[indx] = result
+        return results
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+class _RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def log_message(self, format, *args):
+        _LOGGER.debug("%s %s", self.address_string(), format % args)
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/devices":
+            self._reply(200, self.server.bridge.devices())
+        else:
+            self._reply(404, {"error": "Not found"})
+
+    def do_POST(self):
+        bridge = self.server.bridge
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"null")
+
+            if self.path == "/discover":
+                self._reply(200, bridge.discover())
+            elif self.path == "/batch":
+                self._reply(200, bridge.batch(payload))
+            elif self.path in ("/emit", "/learn", "/rf433"):
+                if not isinstance(payload, dict):
+                    raise OrviboException("Command must be an object")
+                payload["action"] = self.path[1:]
+                self._reply(200, bridge.execute(payload))
+            else:
+                self._reply(404, {"error": "Not found"})
+        except (OrviboException, ValueError, TypeError) as e:
+            self._reply(400, {"error": str(e)})
+        except OSError as e:
+            # Discovery failed on the device network
+            self._reply(502, {"error": str(e)})
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def create_server(bridge, host="127.0.0.1", port=DEFAULT_PORT, unix_path=None):
+    """Creates HTTP server for the bridge on TCP port or Unix socket."""
+    if unix_path is not None:
+        if os.path.exists(unix_path):
+            os.unlink(unix_path)
+        server = _UnixHTTPServer(unix_path, _RequestHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _RequestHandler)
+    server.bridge = bridge
+    return server
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super(_UnixHTTPConnection, self).__init__("localhost", timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class BridgeClient:
+    """Blocking client of the bridge daemon.
+
+    url -- "http://host:port" or "unix:///path/to/socket"
+    """
+
+    def __init__(self, url, timeout=30):
+        self.url = url
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "connection", None)
+        if conn is None:
+            parsed = urlparse(self.url)
+            if parsed.scheme == "unix":
+                conn = _UnixHTTPConnection(parsed.path, self.timeout)
+            else:
+                conn = http.client.HTTPConnection(
+                    parsed.hostname, parsed.port or DEFAULT_PORT, timeout=self.timeout
+                )
+            self._local.connection = conn
+        return conn
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode() if payload is not None else None
+        headers = {"Content-Type": "application/json"}
+        for attempt in range(2):
+            conn = self._connection()
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                data = json.loads(response.read())
+                break
+            except (http.client.HTTPException, OSError) as e:
+                # Connection may be closed by the bridge restart, reconnect once
+                conn.close()
+                self._local.connection = None
+                if attempt:
+                    raise OrviboException("Bridge request failed: {}".format(e))
+
+        if response.status != 200:
+            raise OrviboException(data.get("error", "Bridge error"))
+        return data
+
+    def devices(self, rediscover=False):
+        """returns -- map {ip : (ip, mac, type)} like Orvibo.discover does"""
+        if rediscover:
+            devices = self._request("POST", "/discover", {})
+        else:
+            devices = self._request("GET", "/devices")
+        return {
+            d["ip"]: (d["ip"], binascii.unhexlify(mac), d["type"])
+            for mac, d in devices.items()
+        }
+
+    def emit_ir(self, mac, signal):
+        return self._request(
+            "POST",
+            "/emit",
+            {"mac": _hex(mac), "signal": base64.b64encode(signal).decode()},
+        ).get("ok", False)
+
+    def learn(self, mac, timeout=15):
+        signal = self._request(
+            "POST", "/learn", {"mac": _hex(mac), "timeout": timeout}
+        ).get("signal")
+        return base64.b64decode(signal) if signal is not None else None
+
+    def emit_rf433(self, mac, on, keys):
+        return self._request(
+            "POST",
+            "/rf433",
+            {
+                "mac": _hex(mac),
+                "on": on,
+                "keys": [base64.b64encode(key).decode() for key in keys],
+            },
+        ).get("ok", False)
+
+    def batch(self, commands):
+        """Sends many commands in a single request, see Bridge.batch"""
+        return self._request("POST", "/batch", commands)
+
+
+def _hex(mac):
+    return binascii.hexlify(mac).decode() if isinstance(mac, bytes) else mac
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Orvibo bridge daemon")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", help="serve on Unix socket instead of TCP port")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument(
+        "--subnet",
+        action="append",
+        default=[],
+        help="routed network to sweep with unicast discovery, e.g. 10.0.4.0/22",
+    )
+    parser.add_argument("--record", help="records all device traffic to capture file")
+    parser.add_argument("-L", "--loglevel", default="warning")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=args.loglevel.upper())
+
+    recorder = Recorder(args.record) if args.record else None
+    if recorder is not None:
+        recorder.start()
+
+    bridge = Bridge(args.workers, args.subnet)
+    _LOGGER.info("Discovered devices: %s", bridge.discover())
+
+    server = create_server(bridge, args.host, args.port, args.unix)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        bridge.close()
+        if recorder is not None:
+            recorder.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# @file capture.py
+
+# Record/replay of Orvibo traffic for offline testing.
+#
+# Recorder writes every datagram sent or received by the orvibo module into
+# compact binary capture file:
+#
+#   header -- MAGIC + 1 byte format version
+#   record -- 8 bytes float seconds since start, 1 byte direction,
+#             4 bytes IPv4 address, 2 bytes length + datagram itself
+#
+# ReplayDevice plays capture back as simulated device, answering requests
+# with recorded responses after recorded delays, so latency and loss patterns
+# of the real device are reproduced. Run it with:
+#   python -m custom_components.orvibo_remote.orvibo.capture capture.bin --ip 127.0.0.2
+
+import argparse
+import collections
+import logging
+import socket
+import struct
+import threading
+import time
+
+from . import orvibo
+from .orvibo import PACKET_RECEIVED, PACKET_SENT, PORT, OrviboException
+
+MAGIC = b"ORVCAP"
+VERSION = 1
+
+_RECORD = struct.Struct("<dB4sH")
+
+# Serving thread checks for stop this often
+STOP_INTERVAL = 0.1
+
+_LOGGER = logging.getLogger(__name__)
+
+Record = collections.namedtuple("Record", ["time", "direction", "ip", "data"])
+
+
+class Recorder:
+    """Records datagrams of the orvibo module into capture file.
+
+    Usage:
+        with Recorder("capture.bin"):
+            device.emit_ir(signal)
+    """
+
+    def __init__(self, fname):
+        self.fname = fname
+        self._file = None
+        self._start_time = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._file = open(self.fname, "wb")
+        self._file.write(MAGIC + bytes([VERSION]))
+        self._start_time = time.monotonic()
+        orvibo.packet_observers.append(self._observe)
+
+    def stop(self):
+        if self._observe in orvibo.packet_observers:
+            orvibo.packet_observers.remove(self._observe)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _observe(self, direction, ip, data):
+        data = bytes(data)
+        header = _RECORD.pack(
+            time.monotonic() - self._start_time,
+            direction,
+            socket.inet_aton(ip),
+            len(data),
+        )
+        with self._lock:
+            if self._file is not None:
+                self._file.write(header + data)
+
+
+def read_capture(fname):
+    """Reads capture file.
+
+    returns -- list of Record(time, direction, ip, data)
+    raises -- OrviboException if file is not a capture or is truncated
+    """
+    with open(fname, "rb") as f:
+        content = f.read()
+
+    if content[: len(MAGIC) + 1] != MAGIC + bytes([VERSION]):
+        raise OrviboException("{} is not a capture file".format(fname))
+
+    records = []
+    offset = len(MAGIC) + 1
+    while offset < len(content):
+        if offset + _RECORD.size > len(content):
+            raise OrviboException("{} is truncated at {}".format(fname, offset))
+        t, direction, ip, length = _RECORD.unpack_from(content, offset)
+        offset += _RECORD.size
+        if offset + length > len(content):
+            raise OrviboException("{} is truncated at {}".format(fname, offset))
+        records.append(
+            Record(
+                t, direction, socket.inet_ntoa(ip), content[offset : offset + length]
+            )
+        )
+        offset += length
+    return records
+
+
+class ReplayDevice:
+    """Simulated device answering with responses recorded in capture.
+
+    Every recorded request is an exchange together with responses of the
+    replayed device received before the next request. Incoming request is
+    answered by the next exchange with the same command, responses are sent
+    after their recorded delays divided by speed.
+
+    Arguments:
+    records -- capture records, see read_capture
+    ip -- address to listen on, requests are always sent to the Orvibo port
+    device_ip -- recorded device to replay, the most talkative one by default
+    speed -- replay speed factor, 2 replays twice faster
+    """
+
+    def __init__(self, records, ip="127.0.0.1", device_ip=None, speed=1.0):
+        if device_ip is None:
+            responders = collections.Counter(
+                r.ip for r in records if r.direction == PACKET_RECEIVED
+            )
+            device_ip = responders.most_common(1)[0][0] if responders else None
+
+        self.ip = ip
+        self.speed = speed
+        self.exchanges = _exchanges(records, device_ip)
+        self._cursor = 0
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def responses_for(self, data):
+        """Finds responses for request, returns list of (delay, response data)."""
+        count = len(self.exchanges)
+        for step in range(count):
+            indx = (self._cursor + step) % count
+            request, responses = self.exchanges[indx]
+            if request[4:6] == data[4:6]:
+                self._cursor = indx + 1
+                return responses
+        return []
+
+    def start(self):
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((self.ip, PORT))
+        self._sock.settimeout(STOP_INTERVAL)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops serving and waits for the serving thread, so port is free."""
+        self._stop.set()
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                # Datagram socket is not connected
+                pass
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+    def _serve(self):
+        sock = self._sock
+        while not self._stop.is_set():
+            try:
+                data, addr = sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                # Socket is shut down
+                break
+
+            start_time = time.monotonic()
+            for delay, response in self.responses_for(data):
+                wait = start_time + delay / self.speed - time.monotonic()
+                if wait > 0 and self._stop.wait(wait):
+                    return
+                try:
+                    sock.sendto(response, addr)
+                except OSError:
+                    return
+
+
+def _exchanges(records, device_ip):
+    exchanges = []
+    for record in records:
+        if record.direction == PACKET_SENT:
+            exchanges.append((record, []))
+        elif exchanges and record.ip == device_ip:
+            request, responses = exchanges[-1]
+            responses.append(record)
+
+    return [
+        (request.data, [(r.time - request.time, r.data) for r in responses])
+        for request, responses in exchanges
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replays Orvibo capture file")
+    parser.add_argument("capture")
+    parser.add_argument("--ip", default="127.0.0.1", help="address to listen on")
+    parser.add_argument("--device", help="recorded device ip to replay")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    device = ReplayDevice(read_capture(args.capture), args.ip, args.device, args.speed)
+    _LOGGER.info("Replaying %d exchanges at %s", len(device.exchanges), args.ip)
+    device.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        device.stop()
+
+
+if __name__ == "__main__":
+    main()
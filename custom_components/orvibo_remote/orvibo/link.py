@@ -0,0 +1,76 @@
+# @file link.py
+
+# Serialized access to single Orvibo device, shared by the bridge daemon and
+# the Home Assistant integration.
+#
+# Every call holds the device lock, so the device socket (including the one
+# opened by keep_connection) is never used from two threads at once, while
+# calls to different devices still run in parallel.
+
+import logging
+import threading
+
+from .orvibo import OrviboException
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class DeviceLink:
+    """Runs blocking calls of single Orvibo device one at a time.
+
+    With keep_connection device socket is opened and subscribed once and
+    reused by all calls, per-call sockets are used while it can't be opened.
+
+    Arguments:
+    device -- Orvibo device
+    keep_connection -- keeps subscribed socket open between calls
+    """
+
+    def __init__(self, device, keep_connection=False):
+        self.device = device
+        self._keep_connection = keep_connection
+        self._lock = threading.Lock()
+
+    def _connect(self, timeout=None):
+        if self._keep_connection and not self.device.keep_connection:
+            try:
+                self.device.connect(timeout)
+            except OrviboException as e:
+                _LOGGER.debug("%s: %s, will try again next time", self.device, e)
+        return self.device.keep_connection
+
+    def run(self, func, *args):
+        """Runs blocking device call in the calling thread under the device lock."""
+        with self._lock:
+            self._connect()
+            return func(*args)
+
+    def connect(self, timeout=None):
+        """Opens and subscribes device socket ahead of calls.
+
+        Arguments:
+        timeout -- [optional] number of seconds to wait for the first
+                   subscription response, see Orvibo.subscribe
+
+        returns -- True if the socket is kept open
+        """
+        with self._lock:
+            return self._connect(timeout)
+
+    def heartbeat(self, timeout=None):
+        """Checks that device responds, reconnects the kept socket if it's closed.
+
+        Arguments:
+        timeout -- [optional] see connect
+
+        returns -- True if device responded
+        """
+        with self._lock:
+            if self._keep_connection and not self.device.keep_connection:
+                return self._connect(timeout)
+            return self.device.subscribe(timeout) is not None
+
+    def close(self):
+        """Closes the device socket."""
+        with self._lock:
+            self.device.close()
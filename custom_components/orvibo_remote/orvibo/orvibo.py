@@ -11,17 +11,29 @@
 #   1.4 keep connection functionality implemented
 #   1.4.1 Learn/Emit logging improved
 #   1.5 Learn/Emit Orvibo SmartSwitch RF433 MHz signal support added
-__version__ = "1.5"
-
+#   1.6 Batch mode, cached RF433 keys, AllOne is woken up only when idle
+#   1.7 Unicast discovery of routed networks, IR signal streaming
+#   1.8 Compact Packet and Orvibo objects, single logger with device context
+#   1.9 Discovery without response limit, sharded parallel subnet sweep
+#   1.10 Acknowledgements of streamed IR signals are counted
+#   1.11 Synchronized IR emit of several AllOne devices
+__version__ = "1.11"
+
+import base64
 import binascii
+import ipaddress
+import json
 import logging
+import os
 import random
 import select
 import socket
 import struct
 import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
 
 py3 = sys.version_info[0] == 3
 
@@ -55,6 +67,28 @@ BLAST_IR = b"\x69\x63"
 BLAST_RF433 = CONTROL
 LEARN_RF433 = CONTROL
 
+# Constant parts of request payloads, shared by all packets
+BLAST_IR_FLAGS = b"\x65\x00\x00\x00"
+BLAST_RF433_FLAGS = b"\x29\x00"
+LEARN_IR_FLAGS = b"\x01\x00" + ZEROS_4
+
+_LENGTH = struct.Struct(">h")
+
+# Single logger for all devices, records carry orvibo_ip field
+_LOGGER = logging.getLogger(__name__)
+
+# AllOne has to be woken up before RF433 emit if it was idle longer than this
+RF433_WAKE_UP_TIMEOUT = 30
+# Kept socket isn't subscribed again before emit for this number of seconds
+SUBSCRIPTION_TIMEOUT = 30
+
+# Broadcast discovery stops collecting responses after this number of seconds
+DISCOVER_TIMEOUT = 10
+# Subnet sweep splits networks into shards of at most this number of hosts
+DISCOVER_SHARD_SIZE = 1024
+# Number of seconds to wait for acknowledgements of the last streamed emits
+STREAM_ACK_TIMEOUT = 0.3
+
 
 class OrviboException(Exception):
     """Module level exception class."""
@@ -68,9 +102,7 @@ def _reverse_bytes(mac):
 
     mac -- bytes to reverse
     """
-    ba = bytearray(mac)
-    ba.reverse()
-    return bytes(ba)
+    return bytes(mac)[::-1]
 
 
 def _random_byte():
@@ -79,10 +111,9 @@ def _random_byte():
 
 
 def _random_n_bytes(n):
-    res = b""
-    for n in range(n):
-        res += _random_byte()
-    return res
+    if n <= 0:
+        return b""
+    return random.getrandbits(8 * n).to_bytes(n, "little")
 
 
 def _packet_id():
@@ -104,11 +135,16 @@ _placeholders = [
 ]
 
 
+_placeholders_hex = [
+    (binascii.hexlify(globals()[s]), b" + " + s.encode() + b" + ")
+    for s in _placeholders
+]
+
+
 def _debug_data(data):
     data = binascii.hexlify(bytearray(data))
-    for s in _placeholders:
-        p = binascii.hexlify(bytearray(globals()[s]))
-        data = data.replace(p, b" + " + s.encode() + b" + ")
+    for p, s in _placeholders_hex:
+        data = data.replace(p, s)
     return data[3:]
 
 
@@ -136,6 +172,57 @@ def _parse_discover_response(response):
     return (type, mac)
 
 
+def _add_discovered_device(devices, packet):
+    """Adds device from discover response packet to {ip : (ip, mac, type)} map."""
+    orvibo_type, orvibo_mac = _parse_discover_response(packet.data)
+    _LOGGER.debug("Discovered values: type={}, mac={}".format(orvibo_type, orvibo_mac))
+
+    if not orvibo_mac:
+        # Filter ghosts devices
+        return
+
+    devices[packet.ip] = (packet.ip, orvibo_mac, orvibo_type)
+
+
+def _collect_discovered_devices(sock, devices, deadline):
+    """Reads discover responses from socket until monotonic deadline."""
+    while True:
+        wait = deadline - time.monotonic()
+        r, w, x = select.select([sock], [], [], max(0, wait))
+        if sock not in r:
+            if wait <= 0:
+                break
+            continue
+
+        data, addr = sock.recvfrom(1024)
+        if packet_observers:
+            _observe(PACKET_RECEIVED, addr[0], data)
+        if data[4:6] == DISCOVER_RESP:
+            _add_discovered_device(devices, Packet(addr[0], data, Packet.Response))
+
+
+def _collect_responses(sock, cmd, ips, deadline):
+    """Reads responses until all ips answered with cmd or monotonic deadline.
+
+    returns -- set of ips which answered
+    """
+    answered = set()
+    while answered != ips:
+        wait = deadline - time.monotonic()
+        if wait <= 0:
+            break
+        r, w, x = select.select([sock], [], [], wait)
+        if sock not in r:
+            break
+
+        data, addr = sock.recvfrom(1024)
+        if packet_observers:
+            _observe(PACKET_RECEIVED, addr[0], data)
+        if data[4:6] == cmd and addr[0] in ips:
+            answered.add(addr[0])
+    return answered
+
+
 def _create_orvibo_socket(ip=""):
     """Creates socket to talk with Orvibo devices.
 
@@ -152,6 +239,73 @@ def _create_orvibo_socket(ip=""):
     return sock
 
 
+def _create_sweep_socket():
+    """Creates socket on ephemeral port, so parallel sweeps get their own responses."""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.bind(("", 0))
+    return sock
+
+
+def _sweep(hosts, rate, timeout):
+    """Sends DISCOVER to every host at limited rate, collecting responses in between.
+
+    returns -- map {ip : (ip, mac, type)} of discovered devices
+    """
+    devices = {}
+    data = Packet().compile(DISCOVER).data
+    s = _create_sweep_socket()
+    try:
+        interval = 1.0 / rate
+        next_time = time.monotonic()
+        for host in hosts:
+            try:
+                s.sendto(data, (host, PORT))
+                if packet_observers:
+                    _observe(PACKET_SENT, host, data)
+            except socket.error as e:
+                _LOGGER.debug("Skipped {}: {}".format(host, e))
+            next_time += interval
+            _collect_discovered_devices(s, devices, next_time)
+
+        _collect_discovered_devices(s, devices, time.monotonic() + timeout)
+    finally:
+        s.close()
+
+    return devices
+
+
+def _discover_shards(subnets, shard_size=None):
+    """Splits hosts of subnets into shards of at most shard_size hosts of a single
+    subnet, all hosts are in one shard if shard_size is None."""
+    shards = []
+    shard = []
+    seen = set()
+    for subnet in subnets:
+        network = ipaddress.ip_network(subnet, strict=False)
+        if network.num_addresses == 1:
+            hosts = [network.network_address]
+        else:
+            hosts = network.hosts()
+
+        for host in hosts:
+            host = str(host)
+            if host in seen:
+                continue
+            seen.add(host)
+            shard.append(host)
+            if len(shard) == shard_size:
+                shards.append(shard)
+                shard = []
+
+        if shard and shard_size is not None:
+            shards.append(shard)
+            shard = []
+
+    if shard:
+        shards.append(shard)
+    return shards
+
+
 @contextmanager
 def _orvibo_socket(external_socket=None):
     sock = _create_orvibo_socket() if external_socket is None else external_socket
@@ -164,9 +318,37 @@ def _orvibo_socket(external_socket=None):
         pass
 
 
+PACKET_SENT = 0
+PACKET_RECEIVED = 1
+
+# Callables (direction, ip, data) notified about every sent and received datagram
+packet_observers: List[Callable[[int, str, bytes], None]] = []
+
+
+def _observe(direction, ip, data):
+    for observer in packet_observers:
+        observer(direction, ip, data)
+
+
+# RF433 keys read from files, {file name : (mtime, key)}
+_rf433_keys: Dict[str, Tuple[float, bytes]] = {}
+
+
+def _read_rf433_key(fname):
+    """Reads SmartSwitch RF433 key from file, keys are cached until file changes."""
+    mtime = os.stat(fname).st_mtime
+    cached = _rf433_keys.get(fname)
+    if cached is None or cached[0] != mtime:
+        with open(fname, "rb") as f:
+            cached = _rf433_keys[fname] = (mtime, f.read())
+    return cached[1]
+
+
 class Packet:
     """Represents response sender/recepient address and binary data."""
 
+    __slots__ = ("ip", "data", "type")
+
     Request = "request"
     Response = "response"
 
@@ -212,12 +394,48 @@ class Packet:
             r, w, x = select.select([], [sock], [sock], 1)
             if sock in w:
                 sock.sendto(bytearray(self.data), (self.ip, PORT))
+                if packet_observers:
+                    _observe(PACKET_SENT, self.ip, self.data)
             elif sock in x:
                 raise OrviboException("Failed while sending packet.")
             else:
                 # nothing to send
                 break
 
+    def send_once(self, sock):
+        """Sends binary packet via socket once, without waiting for socket readiness.
+
+        Arguments:
+        sock -- socket to send through
+        """
+        if self.data is not None:
+            sock.sendto(self.data, (self.ip, PORT))
+            if packet_observers:
+                _observe(PACKET_SENT, self.ip, self.data)
+
+    @staticmethod
+    def drain(sock, expectResponseType=None, timeout=0):
+        """Discards all packets received by socket.
+
+        Arguments:
+        sock -- socket to drain
+        expectResponseType -- 2 bytes packet command type to count
+        timeout -- number of seconds to wait for every next packet
+
+        returns -- number of discarded packets of expected type
+        """
+        count = 0
+        while True:
+            r, w, x = select.select([sock], [], [], timeout)
+            if sock not in r:
+                break
+            data, addr = sock.recvfrom(1024)
+            if packet_observers:
+                _observe(PACKET_RECEIVED, addr[0], data)
+            if expectResponseType is None or data[4:6] == expectResponseType:
+                count += 1
+        return count
+
     @staticmethod
     def recv(sock, expectResponseType=None, timeout=10):
         """Receive first packet from socket of given type
@@ -232,6 +450,8 @@ class Packet:
             r, w, x = select.select([sock], [], [sock], 1)
             if sock in r:
                 data, addr = sock.recvfrom(1024)
+                if packet_observers:
+                    _observe(PACKET_RECEIVED, addr[0], data)
 
                 if expectResponseType is not None and data[4:6] != expectResponseType:
                     continue
@@ -246,6 +466,32 @@ class Packet:
 
         return response
 
+    @staticmethod
+    def recv_first(sock, expectResponseType, timeout):
+        """Receive first packet of given type, without waiting for the rest.
+
+        Arguments:
+        sock -- socket to listen to
+        expectResponseType -- 2 bytes packet command type
+        timeout -- max number of seconds to wait for the packet
+
+        returns -- received packet, None if nothing came in time
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = deadline - time.monotonic()
+            if wait <= 0:
+                return None
+            r, w, x = select.select([sock], [], [], wait)
+            if sock not in r:
+                return None
+
+            data, addr = sock.recvfrom(1024)
+            if packet_observers:
+                _observe(PACKET_RECEIVED, addr[0], data)
+            if data[4:6] == expectResponseType:
+                return Packet(addr[0], data, Packet.Response)
+
     @staticmethod
     def recv_all(sock, expectResponseType=None, timeout=10):
         res = None
@@ -262,20 +508,34 @@ class Packet:
         *args -- number of bytes strings that will be concatenated, and prefixed with MAGIC heaer and packet length.
         """
 
-        length = len(MAGIC) + 2  # len itself
-        packet = b""
-        for a in args:
-            length += len(a)
-            packet += a
+        packet = b"".join(args)
+        length = len(MAGIC) + 2 + len(packet)  # 2 bytes for len itself
 
-        msg_len_2 = struct.pack(">h", length)
-        self.data = MAGIC + msg_len_2 + packet
+        self.data = MAGIC + _LENGTH.pack(length) + packet
         return self
 
 
+class _DeviceLoggerAdapter(logging.LoggerAdapter):
+    """Prefixes messages with device address and adds it to log record as orvibo_ip."""
+
+    def process(self, msg, kwargs):
+        kwargs["extra"] = self.extra
+        return "{}: {}".format(self.extra["orvibo_ip"], msg), kwargs
+
+
 class Orvibo(object):
     """Represents Orvibo device, such as wifi socket (TYPE_SOCKET) or AllOne IR blaster (TYPE_IRDA)"""
 
+    __slots__ = (
+        "ip",
+        "type",
+        "mac",
+        "__last_subscr_time",
+        "__last_wake_up_time",
+        "__kept_subscr_time",
+        "__socket",
+    )
+
     TYPE_SOCKET = "socket"
     TYPE_IRDA = "irda"
 
@@ -285,7 +545,8 @@ class Orvibo(object):
         self.__last_subscr_time = (
             time.time() - 1
         )  # Orvibo doesn't like subscriptions frequently that 1 in 0.1sec
-        self.__logger = logging.getLogger("{}@{}".format(self.__class__.__name__, ip))
+        self.__last_wake_up_time = None
+        self.__kept_subscr_time = None
         self.__socket = None
         self.mac = mac
 
@@ -307,6 +568,11 @@ class Orvibo(object):
     def __del__(self):
         self.close()
 
+    @property
+    def __logger(self):
+        # Adapter is created on use, so idle devices don't hold loggers
+        return _DeviceLoggerAdapter(_LOGGER, {"orvibo_ip": self.ip})
+
     def close(self):
         if self.__socket is not None:
             try:
@@ -315,6 +581,7 @@ class Orvibo(object):
                 # socket seems not alive
                 pass
             self.__socket = None
+            self.__kept_subscr_time = None
 
     @property
     def keep_connection(self):
@@ -324,15 +591,27 @@ class Orvibo(object):
     @keep_connection.setter
     def keep_connection(self, value):
         """Keeps connection to the Orvibo device."""
+        if value:
+            self.connect()
+        else:
+            self.close()
+
+    def connect(self, timeout=None):
+        """Opens and subscribes socket kept for all requests to the device.
+
+        Arguments:
+        timeout -- [optional] number of seconds to wait for the first
+                   subscription response, see subscribe
+
+        raises -- OrviboException if subscription failed, socket is closed then
+        """
         # Close connection if alive
         self.close()
 
-        if value:
-            self.__socket = _create_orvibo_socket(self.ip)
-            if self.__subscribe(self.__socket) is None:
-                raise OrviboException("Connection subscription error.")
-        else:
+        self.__socket = _create_orvibo_socket(self.ip)
+        if self.__subscribe(self.__socket, timeout) is None:
             self.close()
+            raise OrviboException("Connection subscription error.")
 
     def __repr__(self):
         mac = binascii.hexlify(bytearray(self.mac))
@@ -355,30 +634,19 @@ class Orvibo(object):
         """
         devices = {}
         with _orvibo_socket() as s:
-            logger = logging.getLogger(Orvibo.__class__.__name__)
-            logger.debug("Discovering Orvibo devices")
+            _LOGGER.debug("Discovering Orvibo devices")
             discover_packet = Packet(BROADCAST)
             discover_packet.compile(DISCOVER)
             discover_packet.send(s)
 
-            for indx in range(
-                512
-            ):  # supposer there are less then 512 devices in the network
+            deadline = time.monotonic() + DISCOVER_TIMEOUT
+            while time.monotonic() < deadline:
                 p = discover_packet.recv(s)
                 if p is None:
                     # No more packets in the socket
                     break
 
-                orvibo_type, orvibo_mac = _parse_discover_response(p.data)
-                logger.debug(
-                    "Discovered values: type={}, mac={}".format(orvibo_type, orvibo_mac)
-                )
-
-                if not orvibo_mac:
-                    # Filter ghosts devices
-                    continue
-
-                devices[p.ip] = (p.ip, orvibo_mac, orvibo_type)
+                _add_discovered_device(devices, p)
 
         if ip is None:
             return devices
@@ -390,19 +658,72 @@ class Orvibo(object):
 
         return Orvibo(*devices[ip])
 
-    def subscribe(self):
+    @staticmethod
+    def discover_subnets(subnets, rate=1000, timeout=1, workers=1):
+        """Discover devices by unicast DISCOVER to every host of given subnets.
+
+        Finds devices in routed networks (e.g. other VLANs) which broadcast
+        discovery never reaches. Packets are sent at limited rate, while responses
+        are collected in between.
+
+        With several workers hosts are split into shards by subnet, subnets
+        larger than DISCOVER_SHARD_SIZE hosts into several shards, and shards
+        are swept in parallel, so one large site doesn't hold up the others.
+
+        Arguments:
+        subnets -- list of networks in CIDR notation, e.g. ["192.168.10.0/22"]
+        rate -- max number of DISCOVER packets per second of every worker
+        timeout -- number of seconds to wait for responses after the last packet
+        workers -- number of shards swept at the same time
+
+        returns -- map {ip : (ip, mac, type)} of all discovered devices
+        """
+        start_time = time.monotonic()
+        shards = _discover_shards(subnets, DISCOVER_SHARD_SIZE if workers > 1 else None)
+
+        devices = {}
+        if len(shards) > 1:
+            with ThreadPoolExecutor(
+                max_workers=min(workers, len(shards)), thread_name_prefix="orvibo-sweep"
+            ) as executor:
+                for found in executor.map(
+                    lambda hosts: _sweep(hosts, rate, timeout), shards
+                ):
+                    devices.update(found)
+        elif shards:
+            devices = _sweep(shards[0], rate, timeout)
+
+        elapsed = time.monotonic() - start_time
+        _LOGGER.debug(
+            "Discovered {} devices at {} hosts in {} shards in {:.2f} sec, {:.1f} devices/sec".format(
+                len(devices),
+                sum(len(hosts) for hosts in shards),
+                len(shards),
+                elapsed,
+                len(devices) / elapsed if elapsed else 0,
+            )
+        )
+        return devices
+
+    def subscribe(self, timeout=None):
         """Subscribe to device.
 
+        Arguments:
+        timeout -- [optional] number of seconds to wait for the first response,
+                   packet is sent once and the rest of responses is not waited
+                   for, by default all responses are read till device is silent
+
         returns -- last response byte, which represents device state
         """
         with _orvibo_socket(self.__socket) as s:
-            return self.__subscribe(s)
+            return self.__subscribe(s, timeout)
 
-    def __subscribe(self, s):
+    def __subscribe(self, s, timeout=None):
         """Required action after connection to device before sending any requests
 
         Arguments:
         s -- socket to use for subscribing
+        timeout -- [optional] see subscribe
 
         returns -- last response byte, which represents device state
         """
@@ -414,11 +735,34 @@ class Orvibo(object):
         subscr_packet.compile(
             SUBSCRIBE, self.mac, SPACES_6, _reverse_bytes(self.mac), SPACES_6
         )
-        subscr_packet.send(s)
-        response = subscr_packet.recv_all(s, SUBSCRIBE_RESP)
+        if timeout is None:
+            subscr_packet.send(s)
+            response = subscr_packet.recv_all(s, SUBSCRIBE_RESP)
+        else:
+            subscr_packet.send_once(s)
+            response = Packet.recv_first(s, SUBSCRIBE_RESP, timeout)
 
         self.__last_subscr_time = time.time()
-        return response.data[-1] if response is not None else None
+        if s is self.__socket:
+            self.__kept_subscr_time = None if response is None else time.time()
+        if response is None:
+            return None
+
+        self.__last_wake_up_time = self.__last_subscr_time
+        return response.data[-1]
+
+    def __ensure_subscribed(self, s):
+        """Subscribes, unless s is the kept socket subscribed recently.
+
+        returns -- False if subscription failed
+        """
+        if (
+            s is self.__socket
+            and self.__kept_subscr_time is not None
+            and time.time() - self.__kept_subscr_time < SUBSCRIPTION_TIMEOUT
+        ):
+            return True
+        return self.__subscribe(s) is not None
 
     def __control_s20(self, switchOn):
         """Switch S20 wifi socket on/off
@@ -537,7 +881,7 @@ class Orvibo(object):
             self.__logger.debug("Entering to Learning IR/RF433 mode")
 
             learn_packet = Packet(self.ip).compile(
-                LEARN_IR, self.mac, SPACES_6, b"\x01\x00", ZEROS_4
+                LEARN_IR, self.mac, SPACES_6, LEARN_IR_FLAGS
             )
             learn_packet.send(s)
             if learn_packet.recv(s, LEARN_IR_RESP) is None:
@@ -599,32 +943,65 @@ class Orvibo(object):
 
             return signal
 
+    def _rf433_packet(self, on, key):
+        return Packet(self.ip).compile(
+            BLAST_RF433,
+            self.mac,
+            SPACES_6,
+            key[:4],
+            _packet_id(),
+            b"\x01" if on else b"\x00",
+            BLAST_RF433_FLAGS,
+            key[4:],
+        )
+
+    def _wake_up_rf433(self):
+        """Wakes AllOne up before RF433 emit, only if it was idle for a while."""
+        if (
+            self.__last_wake_up_time is None
+            or time.time() - self.__last_wake_up_time > RF433_WAKE_UP_TIMEOUT
+        ):
+            self.__logger.debug("Waking up before RF433 emit")
+            self.emit_ir(b" ")
+
     def _learn_emit_rf433(self, on, key):
         """Learn/emit SmartSwitch RF433 signal."""
+        self._wake_up_rf433()
         with _orvibo_socket(self.__socket) as s:
             # this also comes with 64 62 packet
-            signal_packet = Packet(self.ip).compile(
-                BLAST_RF433,
-                self.mac,
-                SPACES_6,
-                key[:4],
-                _packet_id(),
-                b"\x01" if on else b"\x00",
-                b"\x29\x00",
-                key[4:],
-            )
+            signal_packet = self._rf433_packet(on, key)
             signal_packet.send(s)
             signal_packet.recv_all(s)
             self.__logger.debug("{}".format(signal_packet))
 
     def emit_rf433(self, on, fname):
-        """Emit RF433 signal for Orvibo SmartSwitch only."""
-        key = b""
-        with open(fname, "rb") as f:
-            key = f.read()
+        """Emit RF433 signal for Orvibo SmartSwitch only.
 
+        Arguments:
+        on -- True to switch on, False to switch off
+        fname -- file name with SmartSwitch key or key itself
+        """
+        key = _read_rf433_key(fname) if isinstance(fname, str) else fname
         self._learn_emit_rf433(on, key)
 
+    def emit_rf433_many(self, on, keys):
+        """Switch group of Orvibo SmartSwitches on/off in a single batch.
+
+        All packets are sent one after another over the same socket and
+        responses are drained once at the end.
+
+        Arguments:
+        on -- True to switch on, False to switch off
+        keys -- list of SmartSwitch keys
+        """
+        self._wake_up_rf433()
+        with _orvibo_socket(self.__socket) as s:
+            for key in keys:
+                signal_packet = self._rf433_packet(on, key)
+                signal_packet.send(s)
+                self.__logger.debug("{}".format(signal_packet))
+            Packet.recv_all(s)
+
     def emit_ir(self, signal):
         """Emit IR signal
 
@@ -635,7 +1012,7 @@ class Orvibo(object):
         """
 
         with _orvibo_socket(self.__socket) as s:
-            if self.__subscribe(s) is None:
+            if not self.__ensure_subscribed(s):
                 self.__logger.warn("Subscription failed while emiting IR signal")
                 return False
 
@@ -654,18 +1031,369 @@ class Orvibo(object):
                     signal = f.read()
 
             signal_packet = Packet(self.ip).compile(
-                BLAST_IR, self.mac, SPACES_6, b"\x65\x00\x00\x00", _packet_id(), signal
+                BLAST_IR, self.mac, SPACES_6, BLAST_IR_FLAGS, _packet_id(), signal
             )
             signal_packet.send(s)
             signal_packet.recv_all(s)
             self.__logger.info("IR signal emit successfuly")
             return True
 
+    @staticmethod
+    def emit_ir_synchronized(emits, at=None, timeout=1):
+        """Emit IR signals of several AllOne devices at the same moment.
+
+        All devices are subscribed through single socket at once and packets
+        are built ahead, then released from the socket in a tight burst at
+        monotonic clock moment, so devices emit with minimal skew.
+
+        Arguments:
+        emits -- list of (Orvibo device, raw signal)
+        at -- [optional] time.monotonic() moment to release burst at, right
+              after subscription by default
+        timeout -- number of seconds to wait for subscriptions and for
+                   acknowledgements
+
+        returns -- report {"sent": n, "acked": n, "skew_ms": time between the
+                   first and the last packet of burst, "failed": [ips of devices
+                   which couldn't be subscribed or are not AllOne]}
+        """
+        devices = {device.ip: device for device, _ in emits}
+        s = _create_sweep_socket()
+        try:
+            for device in devices.values():
+                Packet(device.ip).compile(
+                    SUBSCRIBE,
+                    device.mac,
+                    SPACES_6,
+                    _reverse_bytes(device.mac),
+                    SPACES_6,
+                ).send_once(s)
+            subscribed = _collect_responses(
+                s, SUBSCRIBE_RESP, set(devices), time.monotonic() + timeout
+            )
+
+            now = time.time()
+            for ip in subscribed:
+                devices[ip].__last_subscr_time = devices[ip].__last_wake_up_time = now
+
+            burst = [
+                (
+                    Packet(device.ip)
+                    .compile(
+                        BLAST_IR,
+                        device.mac,
+                        SPACES_6,
+                        BLAST_IR_FLAGS,
+                        _packet_id(),
+                        signal,
+                    )
+                    .data,
+                    (device.ip, PORT),
+                )
+                for device, signal in emits
+                if device.ip in subscribed and device.type == Orvibo.TYPE_IRDA
+            ]
+
+            if at is not None:
+                # Sleep is not precise, so the last couple of milliseconds are spun
+                while at - time.monotonic() > 0.002:
+                    time.sleep(at - time.monotonic() - 0.002)
+                while time.monotonic() < at:
+                    pass
+
+            send_times = []
+            for data, address in burst:
+                s.sendto(data, address)
+                send_times.append(time.monotonic())
+
+            if packet_observers:
+                for data, address in burst:
+                    _observe(PACKET_SENT, address[0], data)
+
+            acked = _collect_responses(
+                s,
+                BLAST_IR,
+                {address[0] for _, address in burst},
+                time.monotonic() + timeout,
+            )
+        finally:
+            s.close()
+
+        report = {
+            "sent": len(burst),
+            "acked": len(acked),
+            "skew_ms": round((send_times[-1] - send_times[0]) * 1000, 3)
+            if send_times
+            else 0,
+            "failed": sorted(set(devices) - {address[0] for _, address in burst}),
+        }
+        _LOGGER.info("Synchronized IR emit: {}".format(report))
+        return report
+
+    def emit_ir_stream(self, signal, interval, stop, timeout=10, acks=None):
+        """Emit IR signal repeatedly at fixed rate, like a held remote button.
+
+        Device is subscribed once, then packets are sent on a monotonic clock
+        schedule without waiting for acknowledgements. Acknowledgements are
+        counted in between, so lost emits can be told.
+
+        Arguments:
+        signal -- raw signal got with learn method
+        interval -- number of seconds between emits
+        stop -- threading.Event which stops streaming once set
+        timeout -- max number of seconds to stream
+        acks -- [optional] list to append monotonic time of every received
+                acknowledgement to
+
+        returns -- list of monotonic times of emits, None if emit failed
+        """
+
+        with _orvibo_socket(self.__socket) as s:
+            if not self.__ensure_subscribed(s):
+                self.__logger.warn("Subscription failed while streaming IR signal")
+                return None
+
+            if self.type != Orvibo.TYPE_IRDA:
+                self.__logger.warn(
+                    "Attempt to stream IR signal for device with type {}".format(
+                        self.type
+                    )
+                )
+                return None
+
+            header = BLAST_IR + self.mac + SPACES_6 + BLAST_IR_FLAGS
+            emit_times = []
+            start_time = next_time = time.monotonic()
+            while not stop.is_set() and next_time - start_time < timeout:
+                # Every emit gets its own packet id, like separate button presses do
+                signal_packet = Packet(self.ip).compile(header, _packet_id(), signal)
+                signal_packet.send_once(s)
+                emit_times.append(time.monotonic())
+                acked = Packet.drain(s, BLAST_IR)
+                if acks is not None:
+                    acks.extend([time.monotonic()] * acked)
+
+                next_time += interval
+                stop.wait(max(0, next_time - time.monotonic()))
+
+            if acks is not None:
+                acked = Packet.drain(s, BLAST_IR, STREAM_ACK_TIMEOUT)
+                acks.extend([time.monotonic()] * acked)
+
+            self.__logger.info("IR signal streamed {} times".format(len(emit_times)))
+            return emit_times
+
+
+BATCH_ACTIONS = ("emit", "learn", "on", "off", "state", "rf-on", "rf-off")
+# Actions which can't do without a code
+BATCH_SIGNAL_ACTIONS = ("emit", "rf-on", "rf-off")
+
+
+def _read_signal(code, cache):
+    """Reads IR/RF433 signal from "b64:"/"hex:" prefixed string or file name.
+
+    Arguments:
+    code -- signal in one of supported formats
+    cache -- dict of already read signals
+    """
+    if code not in cache:
+        if code.startswith("b64:"):
+            cache[code] = base64.b64decode(code[4:])
+        elif code.startswith("hex:"):
+            cache[code] = binascii.unhexlify(code[4:])
+        else:
+            with open(code, "rb") as f:
+                cache[code] = f.read()
+    return cache[code]
+
+
+def load_batch_plan(fname):
+    """Loads batch plan from JSON file or script file.
+
+    JSON plan is a list of {"target": ..., "action": ..., "code": ...} objects.
+    Script has one "<ip|mac> <action> [code]" command per line, "#" starts a comment.
+    Code is required by emit, rf-on and rf-off actions.
+
+    returns -- list of commands dicts
+    raises -- OrviboException if some command is not valid
+    """
+    with open(fname) as f:
+        content = f.read()
+
+    if content.lstrip().startswith("["):
+        plan = json.loads(content)
+    else:
+        plan = []
+        for line in content.splitlines():
+            fields = line.split("#", 1)[0].split()
+            if not fields:
+                continue
+            plan.append(
+                {
+                    "target": fields[0],
+                    "action": fields[1] if len(fields) > 1 else None,
+                    "code": fields[2] if len(fields) > 2 else None,
+                }
+            )
+
+    for indx, command in enumerate(plan):
+        if not isinstance(command, dict):
+            raise OrviboException("Command #{} is not an object".format(indx + 1))
+        command["index"] = indx + 1
+        if not isinstance(command.get("target"), str) or not command["target"]:
+            raise OrviboException("Missing target in command #{}".format(indx + 1))
+        if command.get("action") not in BATCH_ACTIONS:
+            raise OrviboException(
+                "Unknown action {} in command #{}".format(
+                    command.get("action"), indx + 1
+                )
+            )
+        if command["action"] in BATCH_SIGNAL_ACTIONS and not command.get("code"):
+            raise OrviboException(
+                "Missing code for {} in command #{}".format(command["action"], indx + 1)
+            )
+    return plan
+
+
+def _resolve_batch_devices(targets, cache_fname=None):
+    """Finds (ip, mac, type) for every ip/mac target.
+
+    Known devices are taken from the cache file, discovery runs only once and
+    only if some target is not cached yet.
+
+    returns -- map {target : (ip, mac, type)}
+    """
+    known = {}
+    if cache_fname is not None:
+        try:
+            with open(cache_fname) as f:
+                for mac, (ip, otype) in json.load(f).items():
+                    known[mac] = (ip, binascii.unhexlify(mac), otype)
+        except (IOError, ValueError):
+            pass
+
+    def lookup(target):
+        target = target.lower()
+        if target in known:
+            return known[target]
+        for device in known.values():
+            if device[0] == target:
+                return device
+        return None
+
+    if any(lookup(target) is None for target in targets):
+        for ip, mac, otype in Orvibo.discover().values():
+            known[binascii.hexlify(mac).decode()] = (ip, mac, otype)
+
+        if cache_fname is not None:
+            with open(cache_fname, "w") as f:
+                json.dump(
+                    {mac: [ip, otype] for mac, (ip, _, otype) in known.items()}, f
+                )
+
+    return {target: lookup(target) for target in targets}
+
+
+def _run_device_commands(device_info, commands, signals):
+    """Runs commands for single device one by one over a single socket."""
+    results = []
+
+    try:
+        d = Orvibo(*device_info)
+        d.keep_connection = True
+    except (OrviboException, IOError) as e:
+        for command in commands:
+            results.append(dict(command, ok=False, elapsed_ms=0, error=str(e)))
+        return results
+
+    try:
+        for command in commands:
+            action, code = command["action"], command.get("code")
+            start_time = time.time()
+            result = dict(command)
+            try:
+                if action == "emit":
+                    result["ok"] = d.emit_ir(_read_signal(code, signals))
+                elif action == "learn":
+                    signal = d.learn(code)
+                    result["ok"] = signal is not None
+                    if signal is not None:
+                        result["signal"] = "b64:" + base64.b64encode(signal).decode()
+                elif action in ("on", "off"):
+                    d.on = action == "on"
+                    result["ok"] = d.on == (action == "on")
+                elif action == "state":
+                    result["ok"] = True
+                    result["on"] = d.on
+                else:
+                    d.emit_rf433(action == "rf-on", _read_signal(code, signals))
+                    result["ok"] = True
+            except (OrviboException, IOError, ValueError) as e:
+                result["ok"] = False
+                result["error"] = str(e)
+            result["elapsed_ms"] = round((time.time() - start_time) * 1000, 3)
+            results.append(result)
+    finally:
+        d.close()
+
+    return results
+
+
+def run_batch(plan, cache_fname=None, workers=16):
+    """Runs batch plan concurrently across devices.
+
+    Commands for the same device are run in order over a single socket,
+    different devices are served in parallel.
+
+    Arguments:
+    plan -- list of commands, see load_batch_plan
+    cache_fname -- [optional] JSON file with cached devices info
+    workers -- max number of devices served at the same time
+
+    returns -- dict with per-command results and timings
+    """
+    start_time = time.time()
+    devices = _resolve_batch_devices(
+        {command["target"] for command in plan}, cache_fname
+    )
+    resolved_time = time.time()
+
+    results = []
+    groups = {}
+    for command in plan:
+        device_info = devices[command["target"]]
+        if device_info is None:
+            results.append(
+                dict(command, ok=False, elapsed_ms=0, error="Device not found")
+            )
+            continue
+        groups.setdefault(device_info[1], (device_info, []))[1].append(command)
+
+    signals = {}
+    if groups:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [
+                executor.submit(_run_device_commands, device_info, commands, signals)
+                for device_info, commands in groups.values()
+            ]
+            for future in futures:
+                results.extend(future.result())
+
+    results.sort(key=lambda r: r["index"])
+    return {
+        "ok": all(r["ok"] for r in results),
+        "resolve_ms": round((resolved_time - start_time) * 1000, 3),
+        "total_ms": round((time.time() - start_time) * 1000, 3),
+        "results": results,
+    }
+
 
 def usage():
     print(
         "orvibo.py [-v] [-L <log level>] [-i <ip>] [-m <mac> -x <irda|socket>] [-s <on/off>] [-e <file.ir>] [-t <file.ir>] [-r]"
     )
+    print("orvibo.py [-L <log level>] -b <plan> [-c <cache.json>] [-w <workers>]")
+    print("orvibo.py [-L <log level>] -n <cidr>[,<cidr>...] [-w <workers>]")
     print("-i <ip>    - ip address of the Orvibo device, e.g 192.168.1.10")
     print("-m <mac>   - mac address string, e.g acdf4377dfcc")
     print("             Not valid without -i and -x options")
@@ -684,6 +1412,19 @@ def usage():
     print('             Not valid without -i option or device types other than "irda"')
     print("-v         - prints module version")
     print("-L <level> - extended output information: debug, info, warn")
+    print(
+        "-b <plan>  - runs commands from script or JSON plan concurrently across devices"
+    )
+    print(
+        '             Script line format: "<ip|mac> <action> [code]", actions: '
+        + ", ".join(BATCH_ACTIONS)
+    )
+    print('             Code is file name or "b64:"/"hex:" prefixed signal')
+    print("             Results are printed as JSON")
+    print("-c <fname> - JSON file to cache discovered devices between batch runs")
+    print("-w <n>     - max number of devices served at the same time in batch mode,")
+    print("             max number of subnet shards swept at the same time with -n")
+    print("-n <cidr>  - discovers devices by unicast sweep of comma separated networks")
     print()
     print("Examples:")
     print("Discover all Orvibo devices on the network:")
@@ -702,6 +1443,10 @@ def usage():
     print("> orvibo.py -i 192.168.1.20 -m bdea54883ade -x irda -t smartswitch.rf -r")
     print("Emit SmartSwitch RF signal:")
     print("> orvibo.py -i 192.168.1.20 -m bdea54883ade -x irda -e signal.ir -r -s on")
+    print("Discover Orvibo devices in routed networks:")
+    print("> orvibo.py -n 10.0.4.0/22,10.0.8.0/24")
+    print("Run batch of commands:")
+    print("> orvibo.py -b commands.txt -c devices.json")
 
 
 if __name__ == "__main__":
@@ -720,12 +1465,16 @@ if __name__ == "__main__":
             self.emitFile = None
             self.teachFile = None
             self.rf = False
+            self.batchFile = None
+            self.cacheFile = None
+            self.workers = 16
+            self.subnets = None
 
         def init(self):
             try:
                 opts, args = getopt.getopt(
                     sys.argv[1:],
-                    "rhvL:i:x:m:s:e:t:",
+                    "rhvL:i:x:m:s:e:t:b:c:w:n:",
                     [
                         "loglevel=",
                         "ip=",
@@ -735,6 +1484,10 @@ if __name__ == "__main__":
                         "emit=",
                         "teach=",
                         "zeach=",
+                        "batch=",
+                        "cache=",
+                        "workers=",
+                        "subnets=",
                     ],
                 )
             except getopt.GetoptError:
@@ -766,6 +1519,17 @@ if __name__ == "__main__":
                     self.teachFile = arg
                 elif opt in ("-r", "--rf"):
                     self.rf = True
+                elif opt in ("-b", "--batch"):
+                    self.batchFile = arg
+                elif opt in ("-c", "--cache"):
+                    self.cacheFile = arg
+                elif opt in ("-w", "--workers"):
+                    try:
+                        self.workers = int(arg)
+                    except ValueError:
+                        return False
+                elif opt in ("-n", "--subnets"):
+                    self.subnets = arg.split(",")
             return True
 
         def discover_all(self):
@@ -808,6 +1572,22 @@ if __name__ == "__main__":
 
     logging.basicConfig(level=o.log_level)
 
+    if o.batchFile is not None:
+        try:
+            plan = load_batch_plan(o.batchFile)
+        except (OrviboException, IOError, ValueError) as e:
+            print(e)
+            sys.exit(2)
+        report = run_batch(plan, o.cacheFile, o.workers)
+        print(json.dumps(report, indent=2))
+        sys.exit(0 if report["ok"] else 1)
+
+    if o.subnets is not None:
+        for d in Orvibo.discover_subnets(o.subnets, workers=o.workers).values():
+            d = Orvibo(*d)
+            print(d)
+        sys.exit(0)
+
     if o.discover_all():
         for d in Orvibo.discover().values():
             d = Orvibo(*d)
@@ -838,16 +1618,12 @@ if __name__ == "__main__":
                 print("Already {}.".format("enabled" if o.switch else "disabled"))
     elif d.type == Orvibo.TYPE_IRDA:
         if o.emit_rf():
-            # It is required to wake up AllOne
-            d.emit_ir(b" ")
             d.emit_rf433(o.switch, o.emitFile)
             print("Emit RF done.")
         elif o.emit_ir():
             d.emit_ir(o.emitFile)
             print("Emit IR done.")
         elif o.teach_rf():
-            # It is required to wake up AllOne
-            d.emit_ir(b" ")
             signal = d.learn_rf433(o.teachFile)
             print("Teach RF done.")
         elif o.teach_ir():
@@ -0,0 +1,315 @@
+"""Opt-in profiling of the integration hot paths.
+
+Nothing is patched or wrapped until profile service is called, so there is no
+cost while profiling is off.
+"""
+from __future__ import annotations
+
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional, Protocol, Tuple
+
+import voluptuous as vol
+from homeassistant.core import HomeAssistant, ServiceCall
+
+from . import session
+from .const import (
+    ATTR_DURATION,
+    ATTR_MODE,
+    DATA_PROFILE_LOCK,
+    DOMAIN,
+    SERVICE_PROFILE,
+)
+from .orvibo.orvibo import Orvibo, Packet
+
+_LOGGER = logging.getLogger(__name__)
+
+MODE_SAMPLING = "sampling"
+MODE_DETERMINISTIC = "deterministic"
+
+SAMPLE_INTERVAL = 0.005
+TOP_FUNCTIONS = 15
+
+SCHEMA_PROFILE = vol.Schema(
+    {
+        vol.Optional(ATTR_DURATION, default=30): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=600)
+        ),
+        vol.Optional(ATTR_MODE, default=MODE_SAMPLING): vol.In(
+            [MODE_SAMPLING, MODE_DETERMINISTIC]
+        ),
+    }
+)
+
+
+def _get_lock(hass: HomeAssistant) -> asyncio.Lock:
+    """Return lock of running profile, created within the running loop."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if DATA_PROFILE_LOCK not in data:
+        data[DATA_PROFILE_LOCK] = asyncio.Lock()
+    return data[DATA_PROFILE_LOCK]
+
+
+class Profiler(Protocol):
+    """Collects profile of the integration between start and stop.
+
+    Start and stop are called on the event loop thread and don't block, write
+    and summary are called in the executor after stop.
+    """
+
+    def start(self) -> None:
+        ...
+
+    def stop(self) -> None:
+        ...
+
+    def write(self, path: str) -> None:
+        ...
+
+    def summary(self) -> str:
+        ...
+
+
+class PhaseTimers:
+    """Measures time spent in protocol phases by wrapping their functions.
+
+    Subscribe phase includes its own send and wait for ack.
+    """
+
+    def __init__(self) -> None:
+        from .remote import OrviboRemote
+
+        self._targets: List[Tuple[Any, str, str]] = [
+            (Orvibo, "_Orvibo__subscribe", "subscribe"),
+            (Packet, "send", "send"),
+            (Packet, "send_once", "send"),
+            (Packet, "recv", "wait_for_ack"),
+            (OrviboRemote, "_decode_command", "decode"),
+        ]
+        self._originals: List[Tuple[Any, str, Any]] = []
+        self._stats: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def _wrap(self, phase: str, func: Callable) -> Callable:
+        def timed(*args: Any, **kwargs: Any) -> Any:
+            start_time = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start_time
+                with self._lock:
+                    stats = self._stats.setdefault(phase, [0, 0.0, 0.0])
+                    stats[0] += 1
+                    stats[1] += elapsed
+                    stats[2] = max(stats[2], elapsed)
+
+        return timed
+
+    def start(self) -> None:
+        for owner, name, phase in self._targets:
+            original = owner.__dict__[name]
+            self._originals.append((owner, name, original))
+            if isinstance(original, staticmethod):
+                setattr(owner, name, staticmethod(self._wrap(phase, original.__func__)))
+            else:
+                setattr(owner, name, self._wrap(phase, original))
+
+    def stop(self) -> None:
+        for owner, name, original in reversed(self._originals):
+            setattr(owner, name, original)
+        self._originals.clear()
+
+    def summary(self) -> str:
+        lines = [
+            "{:<14}{:>8}{:>12}{:>12}{:>12}".format(
+                "phase", "calls", "total ms", "mean ms", "max ms"
+            )
+        ]
+        for phase, (count, total, longest) in sorted(self._stats.items()):
+            lines.append(
+                "{:<14}{:>8}{:>12.3f}{:>12.3f}{:>12.3f}".format(
+                    phase, count, total * 1000, total / count * 1000, longest * 1000
+                )
+            )
+        return "\n".join(lines)
+
+
+class Sampler:
+    """Samples stacks of all threads which run the integration code."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL) -> None:
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stacks: Counter = Counter()
+        self.functions: Counter = Counter()
+        self.samples = 0
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name="orvibo-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _join(self) -> None:
+        # Sampling thread finishes its last sample after stop
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self) -> None:
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self._interval):
+            self.samples += 1
+            for ident, top_frame in sys._current_frames().items():
+                if ident == own_ident:
+                    continue
+
+                stack = []
+                frame: Optional[FrameType] = top_frame
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(
+                        "{}:{}".format(os.path.basename(code.co_filename), code.co_name)
+                    )
+                    frame = frame.f_back
+
+                if not any(DOMAIN in entry or "orvibo" in entry for entry in stack):
+                    continue
+
+                self.stacks[";".join(reversed(stack))] += 1
+                self.functions[stack[0]] += 1
+
+    def write(self, path: str) -> None:
+        """Write collapsed stacks, ready for flame graph tools."""
+        self._join()
+        with open(path, "w") as f:
+            for stack, count in self.stacks.most_common():
+                f.write("{} {}\n".format(stack, count))
+
+    def summary(self) -> str:
+        self._join()
+        total = sum(self.functions.values()) or 1
+        lines = ["{} samples, hottest functions:".format(self.samples)]
+        for function, count in self.functions.most_common(TOP_FUNCTIONS):
+            lines.append("{:>7.2%}  {}".format(count / total, function))
+        return "\n".join(lines)
+
+
+class DeterministicProfiler:
+    """cProfile of the event loop thread and of every executor job."""
+
+    def __init__(self) -> None:
+        self._loop_profile = cProfile.Profile()
+        self._job_profiles: List[cProfile.Profile] = []
+        self._lock = threading.Lock()
+
+    def _wrap_job(self, func: Callable) -> Callable:
+        def profiled(*args: Any) -> Any:
+            profile = cProfile.Profile()
+            with self._lock:
+                self._job_profiles.append(profile)
+            return profile.runcall(func, *args)
+
+        return profiled
+
+    def start(self) -> None:
+        session.set_job_wrapper(self._wrap_job)
+        self._loop_profile.enable()
+
+    def stop(self) -> None:
+        self._loop_profile.disable()
+        session.set_job_wrapper(None)
+
+    def _stats(self, stream: Optional[io.StringIO] = None) -> pstats.Stats:
+        stats = pstats.Stats(self._loop_profile, stream=stream)
+        with self._lock:
+            for profile in self._job_profiles:
+                try:
+                    stats.add(profile)
+                except TypeError:
+                    # Job has not finished yet, so profile has no stats
+                    continue
+        return stats
+
+    def write(self, path: str) -> None:
+        self._stats().dump_stats(path)
+
+    def summary(self) -> str:
+        output = io.StringIO()
+        stats = self._stats(output)
+        stats.sort_stats("cumulative").print_stats(DOMAIN, TOP_FUNCTIONS)
+        return output.getvalue()
+
+
+async def async_profile(hass: HomeAssistant, duration: float, mode: str) -> str:
+    """Profile the integration for duration seconds.
+
+    returns -- path of the written profile, summary is written next to it
+    """
+    lock = _get_lock(hass)
+    if lock.locked():
+        raise RuntimeError("Profiling is already running")
+
+    async with lock:
+        timers = PhaseTimers()
+        profiler: Profiler = (
+            Sampler() if mode == MODE_SAMPLING else DeterministicProfiler()
+        )
+
+        _LOGGER.warning("Profiling %s for %s sec in %s mode", DOMAIN, duration, mode)
+        timers.start()
+        profiler.start()
+        try:
+            await asyncio.sleep(duration)
+        finally:
+            # cProfile hooks the thread it is enabled on, so it is unhooked
+            # on the loop thread too, even if profiling is cancelled
+            profiler.stop()
+            timers.stop()
+
+        base = hass.config.path(
+            "{}_profile_{}".format(DOMAIN, time.strftime("%Y%m%d_%H%M%S"))
+        )
+        path = base + (".stacks" if mode == MODE_SAMPLING else ".prof")
+
+        def write() -> str:
+            profiler.write(path)
+            summary = "{}\n\n{}".format(timers.summary(), profiler.summary())
+            with open(base + ".txt", "w") as f:
+                f.write(summary)
+            return summary
+
+        summary = await hass.async_add_executor_job(write)
+        _LOGGER.warning("Profile is written to %s\n%s", path, summary)
+        return path
+
+
+def async_register_services(hass: HomeAssistant) -> None:
+    """Register profile service once."""
+    if hass.services.has_service(DOMAIN, SERVICE_PROFILE):
+        return
+
+    async def async_handle_profile(call: ServiceCall) -> None:
+        if _get_lock(hass).locked():
+            _LOGGER.error("Profiling is already running")
+            return
+
+        hass.async_create_task(
+            async_profile(hass, call.data[ATTR_DURATION], call.data[ATTR_MODE])
+        )
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_PROFILE, async_handle_profile, schema=SCHEMA_PROFILE
+    )
@@ -3,23 +3,97 @@ from __future__ import annotations
 
 import sys
 import logging
+from datetime import timedelta
 from base64 import b64decode
-from collections.abc import Iterable
-from typing import Any, Dict, Iterator, List, Union
+from collections.abc import Awaitable, Iterable
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 from pprint import pprint
 
-from homeassistant.components.remote import RemoteEntity
+import homeassistant.helpers.config_validation as cv
+import voluptuous as vol
+from homeassistant.components.remote import (
+    ATTR_COMMAND,
+    ATTR_HOLD_SECS,
+    ATTR_TIMEOUT,
+    PLATFORM_SCHEMA,
+    RemoteEntity,
+)
+from homeassistant.const import (
+    CONF_HOST,
+    CONF_NAME,
+    EVENT_HOMEASSISTANT_STOP,
+    STATE_ON,
+)
 from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import entity_platform
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.restore_state import RestoreEntity
 from homeassistant.helpers.typing import ConfigType
 
+from .const import (
+    ATTR_RATE,
+    CONF_BRIDGE,
+    CONF_CODE_DATABASE,
+    CONF_DISCOVERY_SUBNETS,
+    CONF_DISCOVERY_WORKERS,
+    CONF_POWER_OFF,
+    CONF_POWER_ON,
+    CONF_POWER_TOGGLE,
+    DATA_CODE_DATABASES,
+    DATA_ENTRY_SESSIONS,
+    DEFAULT_DISCOVERY_WORKERS,
+    DEFAULT_REPEAT_RATE,
+    DEFAULT_REPEAT_TIMEOUT,
+    DOMAIN,
+    SERVICE_SEND_SYNCHRONIZED,
+    SERVICE_START_REPEAT,
+    SERVICE_STOP_REPEAT,
+)
+from .cache import CodeCache
+from .codedb import CodeDatabase
+from .ircode import get_learned_codes
 from .orvibo.orvibo import Orvibo, OrviboException
+from .profiler import async_register_services
+from .session import (
+    DeviceSession,
+    async_get_devices,
+    async_run_in_executor,
+    get_bridge_client,
+    get_code_cache,
+    get_session,
+    valid_subnet,
+)
+from .sync import get_sync_emitter
+from .warmup import async_warm_up, get_usage_stats
 
 logging.basicConfig(level=logging.DEBUG)
 _LOGGER = logging.getLogger(__name__)
 
 DEFAULT_NAME = "Orvibo AllOne remote"
 
+SCAN_INTERVAL = timedelta(seconds=60)
+# Remote is unavailable after this number of heartbeats in a row got no response
+HEARTBEAT_MISSES = 3
+
+PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
+    {
+        vol.Optional(CONF_HOST): cv.string,
+        vol.Optional(CONF_NAME): cv.string,
+        vol.Optional(CONF_BRIDGE): cv.string,
+        vol.Optional(CONF_CODE_DATABASE): cv.string,
+        vol.Optional(CONF_DISCOVERY_SUBNETS, default=[]): vol.All(
+            cv.ensure_list, [valid_subnet]
+        ),
+        vol.Optional(
+            CONF_DISCOVERY_WORKERS, default=DEFAULT_DISCOVERY_WORKERS
+        ): vol.All(vol.Coerce(int), vol.Range(min=1, max=64)),
+        vol.Optional(CONF_POWER_ON): cv.string,
+        vol.Optional(CONF_POWER_OFF): cv.string,
+        vol.Optional(CONF_POWER_TOGGLE): cv.string,
+    }
+)
+
 
 async def async_setup_platform(
     hass: HomeAssistant,
@@ -33,17 +107,43 @@ async def async_setup_platform(
 
     _LOGGER.info("System byte order is %s", sys.byteorder)
 
+    bridge = None
+    if config_entry.get(CONF_BRIDGE):
+        bridge = get_bridge_client(hass, config_entry[CONF_BRIDGE])
+
+    code_db = None
+    if config_entry.get(CONF_CODE_DATABASE):
+        code_db = await _async_get_code_database(hass, config_entry[CONF_CODE_DATABASE])
+
     try:
-        discovered_devices: Dict[str, List[str]] = Orvibo.discover()
-        discovered_devices_payload: Iterator[List[str]] = filter(
+        discovered_devices: Dict[str, Tuple[str, bytes, str]] = await async_get_devices(
+            hass,
+            bridge,
+            config_entry.get(CONF_DISCOVERY_SUBNETS),
+            config_entry.get(CONF_DISCOVERY_WORKERS, DEFAULT_DISCOVERY_WORKERS),
+        )
+        discovered_devices_payload: Iterator[Tuple[str, bytes, str]] = filter(
             lambda x: x[2] == Orvibo.TYPE_IRDA, discovered_devices.values()
         )
 
         for discovered_device_payload in discovered_devices_payload:
             ip = discovered_device_payload[0]
+            if config_entry.get(CONF_HOST, ip) != ip:
+                continue
+
             try:
                 device = Orvibo(*discovered_device_payload)
-                instance = OrviboRemote(DEFAULT_NAME, device)
+                session = get_session(hass, device, bridge)
+                instance = OrviboRemote(
+                    DEFAULT_NAME,
+                    device,
+                    session,
+                    code_db,
+                    get_code_cache(hass),
+                    power_on=config_entry.get(CONF_POWER_ON),
+                    power_off=config_entry.get(CONF_POWER_OFF),
+                    power_toggle=config_entry.get(CONF_POWER_TOGGLE),
+                )
 
                 if instance:
                     _LOGGER.info("Initialized AllOne at %s", ip)
@@ -62,6 +162,58 @@ async def async_setup_platform(
         _LOGGER.warning("No AllOne device has been found in network")
 
     async_add_entities(devices)
+    hass.async_create_task(async_warm_up(hass, devices))
+
+    platform = entity_platform.async_get_current_platform()
+    platform.async_register_entity_service(
+        SERVICE_START_REPEAT,
+        {
+            vol.Required(ATTR_COMMAND): cv.string,
+            vol.Optional(ATTR_RATE, default=DEFAULT_REPEAT_RATE): vol.All(
+                vol.Coerce(float), vol.Range(min=1, max=50)
+            ),
+            vol.Optional(ATTR_TIMEOUT, default=DEFAULT_REPEAT_TIMEOUT): vol.All(
+                vol.Coerce(float), vol.Range(min=0)
+            ),
+        },
+        "async_start_repeat",
+    )
+    platform.async_register_entity_service(SERVICE_STOP_REPEAT, {}, "async_stop_repeat")
+    platform.async_register_entity_service(
+        SERVICE_SEND_SYNCHRONIZED,
+        {vol.Required(ATTR_COMMAND): cv.string},
+        "async_send_synchronized",
+    )
+    async_register_services(hass)
+
+
+async def _async_get_code_database(
+    hass: HomeAssistant, path: str
+) -> Optional[CodeDatabase]:
+    """Open code database once and share it between all remotes."""
+    data = hass.data.setdefault(DOMAIN, {})
+
+    if DATA_CODE_DATABASES not in data:
+        data[DATA_CODE_DATABASES] = {}
+
+        async def async_close_databases(event: Any) -> None:
+            for database in data.pop(DATA_CODE_DATABASES).values():
+                database.close()
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_databases)
+
+    databases = data[DATA_CODE_DATABASES]
+    if path not in databases:
+        try:
+            databases[path] = await async_run_in_executor(CodeDatabase, path)
+        except (OSError, ValueError) as e:
+            _LOGGER.error("Unable to open IR code database %s: %s", path, e)
+            return None
+
+        _LOGGER.info(
+            "Opened IR code database %s with %d codes", path, len(databases[path])
+        )
+    return databases[path]
 
 
 async def async_setup_entry(
@@ -69,20 +221,62 @@ async def async_setup_entry(
     config_entry: ConfigType,
     async_add_entities: AddEntitiesCallback,
 ):
-    """Set up the AllOne remotes config entry."""
-    await async_setup_platform(hass, config_entry, async_add_entities)
+    """Set up the AllOne remotes config entry.
 
+    Sessions of its remotes are remembered, so they are closed on removal.
+    """
+    config = {**config_entry.data, **config_entry.options}
+    entry_sessions = hass.data.setdefault(DOMAIN, {}).setdefault(
+        DATA_ENTRY_SESSIONS, {}
+    )
+    # Reload adds the same sessions again
+    sessions: List[DeviceSession] = []
+    entry_sessions[config_entry.entry_id] = sessions
 
-class OrviboRemote(RemoteEntity):
-    """Representation of a AllOne Remote."""
+    def async_add_entry_entities(
+        entities: Iterable[OrviboRemote], update_before_add: bool = False
+    ) -> None:
+        entities = list(entities)
+        sessions.extend(entity.session for entity in entities)
+        async_add_entities(entities, update_before_add)
+
+    await async_setup_platform(hass, config, async_add_entry_entities)
+
+
+class OrviboRemote(RemoteEntity, RestoreEntity):
+    """Representation of a AllOne Remote.
+
+    Power state is assumed from the power codes sent, and the codes are not
+    sent again while the state doesn't change. Toggle code is used when there
+    is no discrete code for the requested state.
+    """
 
     device: Orvibo
     _attr_is_on: bool = False
 
-    def __init__(self, name: str, device: Orvibo) -> None:
+    def __init__(
+        self,
+        name: str,
+        device: Orvibo,
+        session: DeviceSession = None,
+        code_db: CodeDatabase = None,
+        code_cache: CodeCache = None,
+        power_on: str = None,
+        power_off: str = None,
+        power_toggle: str = None,
+    ) -> None:
         """Initialize the entity."""
         self._name = name
         self._device = device
+        self._session = session or DeviceSession(device)
+        self._code_db = code_db
+        self._code_cache = code_cache
+        self._power_on = power_on
+        self._power_off = power_off
+        self._power_toggle = power_toggle
+        self._last_repeat: Optional[Dict[str, float]] = None
+        self._last_sync: Optional[Dict[str, Any]] = None
+        self._heartbeat_misses = 0
 
         self._attr_unique_id = self._device.mac.hex()
 
@@ -91,29 +285,219 @@ class OrviboRemote(RemoteEntity):
         """Return True if entity is on."""
         return self._attr_is_on
 
-    def turn_on(self, **kwargs: Any) -> None:
-        _LOGGER.warning("Turn on is not implemented for this platform")
-        self._attr_is_on = True
+    @property
+    def session(self) -> DeviceSession:
+        """Return session of the device, shared with its other entities."""
+        return self._session
+
+    @property
+    def available(self) -> bool:
+        """Return True unless device missed HEARTBEAT_MISSES heartbeats in a row."""
+        return self._heartbeat_misses < HEARTBEAT_MISSES
+
+    @property
+    def extra_state_attributes(self) -> Dict[str, Any]:
+        """Return statistics of the last hold-to-repeat stream and device queue."""
+        return {
+            "last_repeat": self._last_repeat,
+            "last_sync": self._last_sync,
+            "queue_wait": self._session.scheduler.stats(),
+            "emit_rate": self._session.governor.rate,
+        }
+
+    async def async_update(self) -> None:
+        """Send heartbeat to device, it never delays user commands."""
+        try:
+            responded = await self._session.async_heartbeat()
+        except OrviboException as e:
+            _LOGGER.warning("AllOne heartbeat failed: %s", e)
+            responded = False
+
+        if responded:
+            self._heartbeat_misses = 0
+        else:
+            self._heartbeat_misses += 1
+
+    def _set_responded(self) -> None:
+        """Device responded to a command, so it is available again."""
+        available = self.available
+        self._heartbeat_misses = 0
+        if not available and self.hass is not None:
+            self.async_write_ha_state()
+
+    @property
+    def assumed_state(self) -> bool:
+        """Return True, power state is never reported by the controlled device."""
+        return True
 
-    def turn_off(self, **kwargs: Any) -> None:
-        _LOGGER.warning("Turn off is not implemented for this platform")
-        self._attr_is_on = False
+    async def async_added_to_hass(self) -> None:
+        """Restore assumed power state, so toggle code is not sent in vain."""
+        await super().async_added_to_hass()
+
+        last_state = await self.async_get_last_state()
+        if last_state is not None:
+            self._attr_is_on = last_state.state == STATE_ON
+
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        await self._async_switch_power(True)
+
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        await self._async_switch_power(False)
+
+    async def _async_switch_power(self, on: bool) -> None:
+        command = (self._power_on if on else self._power_off) or self._power_toggle
+        if command is None:
+            _LOGGER.warning(
+                "Turn %s is not implemented for this platform", "on" if on else "off"
+            )
+        elif self._attr_is_on == on:
+            _LOGGER.debug(
+                "No need to switch %s remote which is already switched %s",
+                "on" if on else "off",
+                "on" if on else "off",
+            )
+            return
+        else:
+            # Raises if code was not sent, assumed state is kept then
+            await self.async_send_command([command])
+
+        self._attr_is_on = on
+        if self.hass is not None:
+            self.async_write_ha_state()
 
     def _decode_command(self, command: Union[str, bytes]) -> bytes:
         """Decode command in format that is suitable for IR emitting"""
         if type(command) is str and command.startswith("b64:"):
             return b64decode(command.replace("b64:", ""))
+        elif type(command) is str and command.startswith("db:"):
+            # Code from database, referenced as "db:brand/model/function"
+            key = command[3:].split("/", 2)
+            code = None
+            if self._code_db is not None and len(key) == 3:
+                code = self._code_db.get(*key)
+            if code is None:
+                raise ValueError("Unable to find the command in code database")
+            return code
         elif type(command) is bytes:
             # No need to decode, assuming it is raw
             return command
 
         raise ValueError("Unable to decode the command")
 
+    def _get_command(self, command: Union[str, bytes]) -> bytes:
+        """Decode command, string commands are cached"""
+        if self._code_cache is None or type(command) is not str:
+            return self._decode_command(command)
+        return self._code_cache.get(command, self._decode_command)
+
     async def async_send_command(self, command: Iterable[str], **kwargs: Any) -> None:
-        """Send a command to device."""
+        """Send a command to device.
+
+        Command is repeated at fixed rate while it is held, if hold_secs is given.
+        Raises HomeAssistantError if device didn't acknowledge the command.
+        """
+        hold_secs = kwargs.get(ATTR_HOLD_SECS)
+
         for encoded_command in command:
-            raw_command = self._decode_command(encoded_command)
+            raw_command = self._get_command(encoded_command)
+            if self.hass is not None and type(encoded_command) is str:
+                get_usage_stats(self.hass).record(encoded_command)
+            if hold_secs:
+                _LOGGER.info("Holding AllOne command => [%s]", raw_command.hex())
+                stream = self._session.start_stream(
+                    raw_command, DEFAULT_REPEAT_RATE, hold_secs
+                )
+                await self._async_finish_repeat(raw_command, stream)
+                continue
+
             _LOGGER.info("Running AllOne command => [%s]", raw_command.hex())
-            result = self._device.emit_ir(raw_command)
+            result = await self._session.async_emit_ir(raw_command)
+            if not result:
+                raise HomeAssistantError(
+                    "AllOne emit failed => [{}]".format(raw_command.hex())
+                )
+
+            _LOGGER.debug("Emit OK")
+            self._set_responded()
+
+    async def async_warm_up(self, commands: List[str]) -> bool:
+        """Prefetch commands into the code cache and subscribe the device."""
+        for command in commands:
+            try:
+                self._get_command(command)
+            except ValueError:
+                # Command of another remote, e.g. from its code database
+                continue
+
+        connected = await self._session.async_connect()
+        if connected:
+            self._set_responded()
+        return connected
+
+    async def async_learn_command(self, **kwargs: Any) -> None:
+        """Learn a command from remote and log it in send_command format."""
+        timeout = kwargs.get("timeout") or 15
+        signal = await self._session.async_learn(timeout)
+
+        if not signal:
+            _LOGGER.error("No signal has been learned")
+            return
+
+        command, duplicate = await get_learned_codes(self.hass).async_add(signal)
+        if duplicate is not None:
+            _LOGGER.warning(
+                "Learned AllOne command is the same as learned before => [%s]",
+                duplicate,
+            )
+            return
+
+        _LOGGER.info("Learned AllOne command => [%s]", command)
+
+    async def _async_finish_repeat(self, raw_command: bytes, stream: Awaitable) -> None:
+        stats = await stream
+
+        if stats is None:
+            _LOGGER.error("Repeat failed => [%s]", raw_command.hex())
+            return
+
+        _LOGGER.debug("Repeat done => %s", stats)
+        self._last_repeat = stats
+        self._heartbeat_misses = 0
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+    async def async_start_repeat(
+        self, command: str, rate: float, timeout: float
+    ) -> None:
+        """Start repeating the command, like a held remote button.
+
+        Repeating stops on stop_repeat call or once timeout expires.
+        """
+        raw_command = self._get_command(command)
+        _LOGGER.info(
+            "Repeating AllOne command at %s Hz => [%s]", rate, raw_command.hex()
+        )
+
+        # Stream is started right away, so stop_repeat can't outrun it
+        stream = self._session.start_stream(raw_command, rate, timeout)
+        self.hass.async_create_task(self._async_finish_repeat(raw_command, stream))
+
+    async def async_stop_repeat(self) -> None:
+        """Stop repeating the command."""
+        self._session.stop_stream()
+
+    async def async_send_synchronized(self, command: str) -> None:
+        """Send command at the same moment as all remotes of the service call."""
+        raw_command = self._get_command(command)
+        key = self._context.id if self._context is not None else None
+
+        report = await get_sync_emitter(self.hass).async_emit(
+            key, self._session, raw_command
+        )
+        if self._session.device.ip in report["failed"]:
+            _LOGGER.error("Synchronized emit failed => [%s]", raw_command.hex())
+        else:
+            self._heartbeat_misses = 0
 
-            _LOGGER.debug("Emit OK") if result else _LOGGER.error("Emit failed => [%s]", raw_command.hex())
+        self._last_sync = report
+        self.async_write_ha_state()
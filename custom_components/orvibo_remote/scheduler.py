@@ -0,0 +1,150 @@
+"""Priority scheduling of jobs sharing single device link."""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# Background job is let through after this number of interactive jobs in a row
+BACKGROUND_SHARE = 4
+# Min number of seconds between background jobs
+BACKGROUND_INTERVAL = 1.0
+
+WAIT_SAMPLES = 100
+
+
+class PriorityScheduler:
+    """Runs jobs of single device one at a time, interactive jobs first.
+
+    Background jobs run only when no interactive job is waiting, at most one
+    per `background_interval` seconds. Under constant interactive load every
+    `background_share` interactive job lets one background job through, so it
+    can't be starved.
+    """
+
+    def __init__(
+        self,
+        runner: Callable[..., Awaitable[Any]],
+        background_share: int = BACKGROUND_SHARE,
+        background_interval: float = BACKGROUND_INTERVAL,
+    ) -> None:
+        self._runner = runner
+        self._background_share = background_share
+        self._background_interval = background_interval
+
+        # FIFO of (priority, queued at, func, args, future)
+        self._queue: List[Tuple[int, float, Callable, tuple, asyncio.Future]] = []
+        self._running = False
+        self._interactive_streak = 0
+        self._last_background = -math.inf
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._waits: Dict[int, Deque[float]] = {
+            priority: deque(maxlen=WAIT_SAMPLES) for priority in PRIORITY_NAMES
+        }
+
+    async def async_run(self, priority: int, func: Callable, *args: Any) -> Any:
+        """Queue job with given priority and return its result."""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.append((priority, time.monotonic(), func, args, future))
+        self._pump()
+        return await future
+
+    def _pick(self) -> Optional[int]:
+        """Return queue index of the next job, None if nothing may run now."""
+        interactive = background = None
+        for indx, job in enumerate(self._queue):
+            if job[0] == PRIORITY_INTERACTIVE and interactive is None:
+                interactive = indx
+            elif job[0] != PRIORITY_INTERACTIVE and background is None:
+                background = indx
+
+        if background is not None:
+            wait = self._last_background + self._background_interval - time.monotonic()
+            if wait > 0:
+                if interactive is None:
+                    self._schedule_pump(wait)
+                background = None
+            elif (
+                interactive is not None
+                and self._interactive_streak < self._background_share
+            ):
+                background = None
+
+        return interactive if background is None else background
+
+    def _schedule_pump(self, delay: float) -> None:
+        if self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(delay, self._pump)
+
+    def _pump(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # Forget jobs of callers that gave up waiting
+        self._queue = [job for job in self._queue if not job[4].done()]
+
+        if self._running:
+            return
+
+        indx = self._pick()
+        if indx is None:
+            return
+
+        priority, queued_at, func, args, future = self._queue.pop(indx)
+        now = time.monotonic()
+        self._waits[priority].append(now - queued_at)
+
+        if priority == PRIORITY_INTERACTIVE:
+            # Only interactive jobs which overtake background ones count
+            if any(job[0] != PRIORITY_INTERACTIVE for job in self._queue):
+                self._interactive_streak += 1
+            else:
+                self._interactive_streak = 0
+        else:
+            self._interactive_streak = 0
+            self._last_background = now
+
+        self._running = True
+        asyncio.ensure_future(self._run(func, args, future))
+
+    async def _run(self, func: Callable, args: tuple, future: asyncio.Future) -> None:
+        try:
+            result = await self._runner(func, *args)
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        else:
+            if not future.done():
+                future.set_result(result)
+        finally:
+            self._running = False
+            self._pump()
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Return queue wait statistics in milliseconds per priority."""
+        stats = {}
+        for priority, waits in self._waits.items():
+            samples = sorted(waits)
+            stats[PRIORITY_NAMES[priority]] = {
+                "count": len(samples),
+                "queued": sum(1 for job in self._queue if job[0] == priority),
+                "mean_ms": round(sum(samples) / len(samples) * 1000, 3)
+                if samples
+                else 0,
+                "p95_ms": round(samples[int(len(samples) * 0.95)] * 1000, 3)
+                if samples
+                else 0,
+                "max_ms": round(samples[-1] * 1000, 3) if samples else 0,
+            }
+        return stats
@@ -0,0 +1,412 @@
+"""Non-blocking access to the blocking Orvibo library."""
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import ipaddress
+import logging
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
+
+import voluptuous as vol
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+
+from .cache import CodeCache
+from .const import (
+    DATA_BRIDGES,
+    DATA_CODE_CACHE,
+    DATA_DEVICES,
+    DATA_SESSIONS,
+    DEFAULT_DISCOVERY_WORKERS,
+    DOMAIN,
+)
+from .governor import EmitGovernor, EmitRates, get_emit_rates
+from .orvibo.bridge import BridgeClient
+from .orvibo.link import DeviceLink
+from .orvibo.orvibo import Orvibo, OrviboException
+from .scheduler import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, PriorityScheduler
+
+_LOGGER = logging.getLogger(__name__)
+
+MAX_WORKERS = 8
+# Background subscriptions wait this long for the first response only, so
+# they give the device lock up quickly to interactive jobs
+BACKGROUND_SUBSCRIBE_TIMEOUT = 0.3
+# Larger discovery subnets would hold discovery of every entry for too long
+MIN_SUBNET_PREFIX = 22
+# Stream holds its thread till it ends, streams get own pool of this size
+MAX_STREAMS = 4
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+_stream_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Wraps every job of the pool while profiling is on
+_job_wrapper: Optional[Callable[[Callable], Callable]] = None
+
+# Discovery binds the shared UDP port, so only one can run at a time
+_discover_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the bounded thread pool shared by all AllOne devices."""
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=MAX_WORKERS, thread_name_prefix="orvibo"
+            )
+        return _executor
+
+
+def get_stream_executor() -> ThreadPoolExecutor:
+    """Return the pool of IR streams, so they never hold up regular calls."""
+    global _stream_executor
+
+    with _executor_lock:
+        if _stream_executor is None:
+            _stream_executor = ThreadPoolExecutor(
+                max_workers=MAX_STREAMS, thread_name_prefix="orvibo-stream"
+            )
+        return _stream_executor
+
+
+def set_job_wrapper(wrapper: Optional[Callable[[Callable], Callable]]) -> None:
+    """Set function wrapping jobs of the shared pool, None to stop wrapping."""
+    global _job_wrapper
+
+    _job_wrapper = wrapper
+
+
+async def async_run_in_executor(
+    func: Callable[..., T],
+    *args: Any,
+    executor: Optional[ThreadPoolExecutor] = None,
+) -> T:
+    """Run blocking function in the shared pool without blocking the event loop.
+
+    executor -- [optional] pool to run in instead of the shared one
+    """
+    loop = asyncio.get_running_loop()
+    if _job_wrapper is not None:
+        func = _job_wrapper(func)
+    return await loop.run_in_executor(executor or get_executor(), func, *args)
+
+
+def valid_subnet(value: Any) -> str:
+    """Validate IPv4 network or host of discovery_subnets, e.g. 10.0.4.0/22."""
+    try:
+        network = ipaddress.IPv4Network(str(value), strict=False)
+    except ValueError as e:
+        raise vol.Invalid("Invalid network {}: {}".format(value, e)) from e
+    if network.prefixlen < MIN_SUBNET_PREFIX:
+        raise vol.Invalid(
+            "Network {} is too large, split it into /{} or smaller networks".format(
+                value, MIN_SUBNET_PREFIX
+            )
+        )
+    return str(value)
+
+
+def _discover(subnets: List[str], workers: int) -> Dict[str, Tuple[str, bytes, str]]:
+    with _discover_lock:
+        start_time = time.monotonic()
+        devices = Orvibo.discover()
+        if subnets:
+            devices.update(Orvibo.discover_subnets(subnets, workers=workers))
+
+        elapsed = time.monotonic() - start_time
+        _LOGGER.info(
+            "Discovered %d AllOne devices in %.2f sec, %.1f devices/sec",
+            len(devices),
+            elapsed,
+            len(devices) / elapsed if elapsed else 0,
+        )
+        return devices
+
+
+async def async_discover(
+    client: BridgeClient = None,
+    subnets: List[str] = None,
+    workers: int = DEFAULT_DISCOVERY_WORKERS,
+) -> Dict[str, Tuple[str, bytes, str]]:
+    """Discover devices in the local network through the shared pool.
+
+    client -- [optional] bridge client to ask for its devices instead
+    subnets -- [optional] routed networks to sweep with unicast discovery
+    workers -- number of subnet shards swept at the same time
+    """
+    if client is not None:
+        return await async_run_in_executor(client.devices)
+    return await async_run_in_executor(_discover, subnets or [], workers)
+
+
+async def async_get_devices(
+    hass: Any,
+    client: BridgeClient = None,
+    subnets: List[str] = None,
+    workers: int = DEFAULT_DISCOVERY_WORKERS,
+) -> Dict[str, Tuple[str, bytes, str]]:
+    """Discover devices once and share result between all platforms."""
+    discoveries = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_DEVICES, {})
+    key = (client.url if client is not None else None, tuple(subnets or []))
+
+    if key not in discoveries:
+        discoveries[key] = asyncio.ensure_future(
+            async_discover(client, subnets, workers)
+        )
+
+    discovery = discoveries[key]
+    devices = None
+    try:
+        devices = await asyncio.shield(discovery)
+    finally:
+        # Let the next platform try again, devices may be still booting
+        if not devices and discoveries.get(key) is discovery:
+            del discoveries[key]
+    return devices
+
+
+def get_bridge_client(hass: Any, url: str) -> BridgeClient:
+    """Return bridge client shared by all platforms, it keeps its connections."""
+    bridges = hass.data.setdefault(DOMAIN, {}).setdefault(DATA_BRIDGES, {})
+
+    if url not in bridges:
+        bridges[url] = BridgeClient(url)
+    return bridges[url]
+
+
+def get_code_cache(hass: Any) -> CodeCache:
+    """Return decoded commands cache shared by all remotes."""
+    return hass.data.setdefault(DOMAIN, {}).setdefault(DATA_CODE_CACHE, CodeCache())
+
+
+def get_session(
+    hass: Any, device: Orvibo, client: BridgeClient = None
+) -> DeviceSession:
+    """Return the session of device shared by all its entities.
+
+    Sessions live in hass.data, so they stay warm when entities are rebuilt
+    on config entry reload, and are closed only when Home Assistant stops.
+    """
+    data = hass.data.setdefault(DOMAIN, {})
+
+    if DATA_SESSIONS not in data:
+        data[DATA_SESSIONS] = {}
+
+        async def async_close_sessions(event: Any) -> None:
+            for session in data.pop(DATA_SESSIONS).values():
+                await async_run_in_executor(session.close)
+
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, async_close_sessions)
+
+    sessions = data[DATA_SESSIONS]
+    if device.mac not in sessions:
+        if client is not None:
+            sessions[device.mac] = BridgeSession(device, client)
+        else:
+            sessions[device.mac] = DeviceSession(
+                device, keep_connection=True, rates=get_emit_rates(hass)
+            )
+    return sessions[device.mac]
+
+
+class DeviceSession(DeviceLink):
+    """Non-blocking access to single Orvibo device.
+
+    Blocking calls run in the shared pool under the device lock of DeviceLink.
+    Calls are queued by the priority scheduler, so user commands never wait
+    behind background ones. Streams are throttled to the emit rate learned by the governor and run in
+    their own pool, so long holds don't take threads of regular calls.
+    """
+
+    def __init__(
+        self, device: Orvibo, keep_connection: bool = False, rates: EmitRates = None
+    ) -> None:
+        super().__init__(device, keep_connection)
+        self.governor = EmitGovernor(rates, device.mac.hex())
+        self._stream_stop: Optional[threading.Event] = None
+        self.scheduler = PriorityScheduler(self._async_run_locked)
+
+    def close(self) -> None:
+        """Stop the stream and close the device socket."""
+        self.stop_stream()
+        super().close()
+
+    async def _async_run_locked(self, func: Callable[..., T], *args: Any) -> T:
+        if func == self._stream:
+            return await async_run_in_executor(
+                self.run, func, *args, executor=get_stream_executor()
+            )
+        if func in (self.connect, self.heartbeat):
+            # Background jobs lock and connect with their short timeout themselves
+            return await async_run_in_executor(func, *args)
+        return await async_run_in_executor(self.run, func, *args)
+
+    async def async_call(
+        self, func: Callable[..., T], *args: Any, priority: int = PRIORITY_INTERACTIVE
+    ) -> T:
+        """Run blocking device call in the shared pool under the device lock."""
+        return await self.scheduler.async_run(priority, func, *args)
+
+    async def async_connect(self) -> bool:
+        """Open and subscribe device socket ahead of commands, as a background job."""
+        return await self.async_call(
+            self.connect, BACKGROUND_SUBSCRIBE_TIMEOUT, priority=PRIORITY_BACKGROUND
+        )
+
+    async def async_heartbeat(self) -> bool:
+        """Check that device responds, as a background job."""
+        return await self.async_call(
+            self.heartbeat, BACKGROUND_SUBSCRIBE_TIMEOUT, priority=PRIORITY_BACKGROUND
+        )
+
+    async def async_emit_ir(self, signal: bytes) -> bool:
+        """Emit IR signal."""
+        return await self.async_call(self.device.emit_ir, signal)
+
+    async def async_learn(self, timeout: int = 15) -> Optional[bytes]:
+        """Wait for IR/RF433 signal from remote and return it."""
+        return await self.async_call(self.device.learn, None, timeout)
+
+    async def async_emit_rf433(self, on: bool, keys: List[bytes]) -> None:
+        """Switch RF433 SmartSwitches with given keys on/off in a single batch."""
+        await self.async_call(self.device.emit_rf433_many, on, keys)
+
+    def start_stream(
+        self, signal: bytes, rate: float, timeout: float
+    ) -> asyncio.Future:
+        """Start emitting IR signal at fixed rate.
+
+        Stream runs until stop_stream is called or timeout expires, a new stream
+        stops the running one.
+
+        returns -- future with emits count, jitter and acknowledgement
+                   statistics, or None if streaming failed
+        """
+        self.stop_stream()
+        stop = self._stream_stop = threading.Event()
+        return asyncio.ensure_future(self._async_stream(signal, rate, stop, timeout))
+
+    async def _async_stream(
+        self, signal: bytes, rate: float, stop: threading.Event, timeout: float
+    ) -> Optional[Dict[str, float]]:
+        rate = await self.governor.async_limit(rate)
+        interval = 1 / rate
+        acks: List[float] = []
+        try:
+            emit_times = await self.async_call(
+                self._stream, signal, interval, stop, timeout, acks
+            )
+        finally:
+            if self._stream_stop is stop:
+                self._stream_stop = None
+
+        if emit_times is None:
+            return None
+
+        self.governor.feedback(rate, len(emit_times), len(acks))
+        stats = stream_stats(emit_times, interval)
+        stats["rate"] = rate
+        stats["acked"] = len(acks)
+        return stats
+
+    def _stream(
+        self,
+        signal: bytes,
+        interval: float,
+        stop: threading.Event,
+        timeout: float,
+        acks: List[float],
+    ) -> Optional[List[float]]:
+        return self.device.emit_ir_stream(signal, interval, stop, timeout, acks=acks)
+
+    def stop_stream(self) -> bool:
+        """Stop running stream, returns False if nothing is streaming."""
+        stop, self._stream_stop = self._stream_stop, None
+        if stop is None:
+            return False
+
+        stop.set()
+        return True
+
+
+def stream_stats(emit_times: List[float], interval: float) -> Dict[str, float]:
+    """Measure how far actual emit intervals are from the nominal one."""
+    jitter = [abs(b - a - interval) * 1000 for a, b in zip(emit_times, emit_times[1:])]
+    return {
+        "count": len(emit_times),
+        "duration_ms": round((emit_times[-1] - emit_times[0]) * 1000, 3)
+        if emit_times
+        else 0,
+        "jitter_mean_ms": round(statistics.mean(jitter), 3) if jitter else 0,
+        "jitter_max_ms": round(max(jitter), 3) if jitter else 0,
+    }
+
+
+def _emit_ir_synchronized(
+    emits: List[Tuple[DeviceSession, bytes]], at: Optional[float]
+) -> Dict[str, Any]:
+    with contextlib.ExitStack() as stack:
+        # Locks are taken in the same order by everyone, so they can't deadlock
+        sessions = {session.device.mac: session for session, _ in emits}
+        for mac in sorted(sessions):
+            stack.enter_context(sessions[mac]._lock)
+        report = Orvibo.emit_ir_synchronized(
+            [(session.device, signal) for session, signal in emits], at
+        )
+    return report
+
+
+async def async_emit_ir_synchronized(
+    emits: List[Tuple[DeviceSession, bytes]], at: Optional[float] = None
+) -> Dict[str, Any]:
+    """Emit IR signals of several devices at the same moment.
+
+    emits -- list of (device session, raw signal)
+    at -- [optional] time.monotonic() moment to emit at
+
+    returns -- report with number of sent and acknowledged emits and skew
+    """
+    if any(isinstance(session, BridgeSession) for session, _ in emits):
+        raise OrviboException("Synchronized emit is not supported through the bridge")
+    return await async_run_in_executor(_emit_ir_synchronized, emits, at)
+
+
+class BridgeSession(DeviceSession):
+    """Device session served by the bridge daemon instead of a local socket.
+
+    The bridge serializes device access itself, so calls are not locked here.
+    """
+
+    def __init__(self, device: Orvibo, client: BridgeClient) -> None:
+        super().__init__(device)
+        self.client = client
+
+    async def async_emit_ir(self, signal: bytes) -> bool:
+        return await async_run_in_executor(self.client.emit_ir, self.device.mac, signal)
+
+    async def async_learn(self, timeout: int = 15) -> Optional[bytes]:
+        return await async_run_in_executor(self.client.learn, self.device.mac, timeout)
+
+    async def async_emit_rf433(self, on: bool, keys: List[bytes]) -> None:
+        await async_run_in_executor(self.client.emit_rf433, self.device.mac, on, keys)
+
+    def start_stream(
+        self, signal: bytes, rate: float, timeout: float
+    ) -> asyncio.Future:
+        raise OrviboException("Streaming is not supported through the bridge")
+
+    async def async_connect(self) -> bool:
+        # The bridge keeps its device sessions warm itself
+        return True
+
+    async def async_heartbeat(self) -> bool:
+        # The bridge keeps its device sessions alive itself
+        return True
@@ -0,0 +1,233 @@
+"""Orvibo SmartSwitch RF433 support through Orvibo AllOne."""
+from __future__ import annotations
+
+import binascii
+import logging
+from typing import Any, Dict, List, Optional
+
+import homeassistant.helpers.config_validation as cv
+import voluptuous as vol
+from homeassistant.components.switch import PLATFORM_SCHEMA, SwitchEntity
+from homeassistant.const import CONF_HOST, CONF_NAME, CONF_SWITCHES
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.storage import Store
+from homeassistant.helpers.typing import ConfigType
+
+from .const import (
+    CONF_BRIDGE,
+    CONF_DISCOVERY_SUBNETS,
+    CONF_DISCOVERY_WORKERS,
+    CONF_GROUP,
+    CONF_KEY,
+    DATA_RF433_KEYS,
+    DEFAULT_DISCOVERY_WORKERS,
+    DOMAIN,
+)
+from .orvibo.orvibo import Orvibo, OrviboException, _random_n_bytes
+from .session import (
+    DeviceSession,
+    async_get_devices,
+    get_bridge_client,
+    get_session,
+    valid_subnet,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+RF433_KEY_LENGTH = 7
+
+STORAGE_KEY = f"{DOMAIN}.rf433"
+STORAGE_VERSION = 1
+
+SWITCH_SCHEMA = vol.Schema(
+    {
+        vol.Optional(CONF_NAME): cv.string,
+        vol.Optional(CONF_KEY): vol.All(
+            cv.string,
+            vol.Match(
+                r"^[0-9a-fA-F]{%d}$" % (2 * RF433_KEY_LENGTH),
+                msg="Key must be %d bytes in hex" % RF433_KEY_LENGTH,
+            ),
+        ),
+    }
+)
+
+PLATFORM_SCHEMA = PLATFORM_SCHEMA.extend(
+    {
+        vol.Optional(CONF_HOST): cv.string,
+        vol.Optional(CONF_BRIDGE): cv.string,
+        vol.Optional(CONF_DISCOVERY_SUBNETS, default=[]): vol.All(
+            cv.ensure_list, [valid_subnet]
+        ),
+        vol.Optional(
+            CONF_DISCOVERY_WORKERS, default=DEFAULT_DISCOVERY_WORKERS
+        ): vol.All(vol.Coerce(int), vol.Range(min=1, max=64)),
+        vol.Optional(CONF_GROUP): cv.string,
+        vol.Required(CONF_SWITCHES): cv.schema_with_slug_keys(SWITCH_SCHEMA),
+    }
+)
+
+
+class RF433KeyStore:
+    """SmartSwitch keys cached in memory and persisted in HA storage.
+
+    Switches without a configured key get a random one, which is paired by
+    turning the switch on while the SmartSwitch is in learning mode.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._keys: Optional[Dict[str, str]] = None
+
+    async def async_get_key(self, key_id: str, configured: str = None) -> bytes:
+        """Return key of the switch, generating it once if it is not configured."""
+        if configured is not None:
+            return binascii.unhexlify(configured)
+
+        if self._keys is None:
+            self._keys = await self._store.async_load() or {}
+
+        if key_id not in self._keys:
+            self._keys[key_id] = _random_n_bytes(RF433_KEY_LENGTH).hex()
+            await self._store.async_save(self._keys)
+
+        return binascii.unhexlify(self._keys[key_id])
+
+
+async def async_setup_platform(
+    hass: HomeAssistant,
+    config: ConfigType,
+    async_add_entities: AddEntitiesCallback,
+    discovery_info=None,
+):
+    """Set up SmartSwitches controlled by AllOne."""
+    bridge = None
+    if config.get(CONF_BRIDGE):
+        bridge = get_bridge_client(hass, config[CONF_BRIDGE])
+
+    try:
+        discovered_devices = await async_get_devices(
+            hass,
+            bridge,
+            config.get(CONF_DISCOVERY_SUBNETS),
+            config.get(CONF_DISCOVERY_WORKERS, DEFAULT_DISCOVERY_WORKERS),
+        )
+    except OrviboException as e:
+        _LOGGER.error("Unable to discover AllOne devices: %s", e)
+        return
+
+    payload = next(
+        (
+            d
+            for d in discovered_devices.values()
+            if d[2] == Orvibo.TYPE_IRDA and d[0] == config.get(CONF_HOST, d[0])
+        ),
+        None,
+    )
+    if payload is None:
+        _LOGGER.error("No AllOne device has been found for SmartSwitches")
+        return
+
+    session = get_session(hass, Orvibo(*payload), bridge)
+    store = hass.data.setdefault(DOMAIN, {}).setdefault(
+        DATA_RF433_KEYS, RF433KeyStore(hass)
+    )
+
+    switches = []
+    for slug, switch_config in config[CONF_SWITCHES].items():
+        key_id = "{}:{}".format(session.device.mac.hex(), slug)
+        key = await store.async_get_key(key_id, switch_config.get(CONF_KEY))
+        switches.append(
+            OrviboRF433Switch(switch_config.get(CONF_NAME, slug), key_id, key, session)
+        )
+
+    entities: List[OrviboRF433Entity] = list(switches)
+    if config.get(CONF_GROUP):
+        entities.append(
+            OrviboRF433SwitchGroup(
+                config[CONF_GROUP], session.device.mac.hex(), switches, session
+            )
+        )
+
+    async_add_entities(entities)
+
+
+class OrviboRF433Entity(SwitchEntity):
+    """Base of SmartSwitch entities with assumed state."""
+
+    _attr_is_on: bool = False
+
+    def __init__(
+        self, name: str, unique_id: str, keys: List[bytes], session: DeviceSession
+    ) -> None:
+        self._attr_name = name
+        self._attr_unique_id = unique_id
+        self._keys = keys
+        self._session = session
+
+    @property
+    def is_on(self) -> bool:
+        return self._attr_is_on
+
+    @property
+    def assumed_state(self) -> bool:
+        return True
+
+    @property
+    def should_poll(self) -> bool:
+        return False
+
+    @property
+    def keys(self) -> List[bytes]:
+        """Keys of SmartSwitches switched by the entity."""
+        return self._keys
+
+    def _set_state(self, on: bool) -> None:
+        self._attr_is_on = on
+        if self.hass is not None:
+            self.async_write_ha_state()
+
+    async def _async_switch(self, on: bool) -> None:
+        await self._session.async_emit_rf433(on, self.keys)
+        self._set_state(on)
+
+    async def async_turn_on(self, **kwargs: Any) -> None:
+        await self._async_switch(True)
+
+    async def async_turn_off(self, **kwargs: Any) -> None:
+        await self._async_switch(False)
+
+
+class OrviboRF433Switch(OrviboRF433Entity):
+    """Representation of Orvibo SmartSwitch."""
+
+    def __init__(
+        self, name: str, unique_id: str, key: bytes, session: DeviceSession
+    ) -> None:
+        super().__init__(name, unique_id, [key], session)
+        self.key = key
+
+
+class OrviboRF433SwitchGroup(OrviboRF433Entity):
+    """All SmartSwitches of AllOne switched in a single batch."""
+
+    def __init__(
+        self,
+        name: str,
+        mac: str,
+        switches: List[OrviboRF433Switch],
+        session: DeviceSession,
+    ) -> None:
+        super().__init__(
+            name,
+            "{}:group".format(mac),
+            [switch.key for switch in switches],
+            session,
+        )
+        self._switches = switches
+
+    async def _async_switch(self, on: bool) -> None:
+        await super()._async_switch(on)
+        for switch in self._switches:
+            switch._set_state(on)
@@ -0,0 +1,67 @@
+"""Synchronized emit of the same moment across several AllOne devices."""
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Tuple
+
+from homeassistant.core import HomeAssistant
+
+from .const import DATA_SYNC_EMITTER, DOMAIN
+from .session import DeviceSession, async_emit_ir_synchronized
+
+_LOGGER = logging.getLogger(__name__)
+
+# Number of seconds to gather emits of all entities targeted by a service call
+GATHER_DELAY = 0.02
+
+
+class SyncEmitter:
+    """Gathers emits requested together into a single synchronized burst.
+
+    Home Assistant calls entity service of every targeted entity separately,
+    emits of calls sharing the same key (service call context) which arrive
+    within GATHER_DELAY are emitted together.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[Any, List[Tuple[DeviceSession, bytes, asyncio.Future]]] = {}
+
+    async def async_emit(
+        self, key: Any, session: DeviceSession, signal: bytes
+    ) -> Dict[str, Any]:
+        """Emit signal together with the others of the same key, return burst report."""
+        loop = asyncio.get_running_loop()
+        if key not in self._pending:
+            self._pending[key] = []
+            loop.call_later(GATHER_DELAY, self._flush, key)
+
+        future = loop.create_future()
+        self._pending[key].append((session, signal, future))
+        return await future
+
+    def _flush(self, key: Any) -> None:
+        asyncio.ensure_future(self._async_burst(self._pending.pop(key)))
+
+    async def _async_burst(
+        self, emits: List[Tuple[DeviceSession, bytes, asyncio.Future]]
+    ) -> None:
+        try:
+            report = await async_emit_ir_synchronized(
+                [(session, signal) for session, signal, _ in emits]
+            )
+        except Exception as e:
+            for _, _, future in emits:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        _LOGGER.info("Synchronized emit of %d AllOne devices => %s", len(emits), report)
+        for _, _, future in emits:
+            if not future.done():
+                future.set_result(report)
+
+
+def get_sync_emitter(hass: HomeAssistant) -> SyncEmitter:
+    """Return synchronized emitter shared by all remotes."""
+    return hass.data.setdefault(DOMAIN, {}).setdefault(DATA_SYNC_EMITTER, SyncEmitter())
@@ -0,0 +1,87 @@
+"""Warm-up of device sessions and frequently used codes after startup."""
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_USAGE, DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_KEY = f"{DOMAIN}.usage"
+STORAGE_VERSION = 1
+SAVE_DELAY = 60
+
+# Only the most used commands are kept between restarts
+MAX_COMMANDS = 1000
+
+PREFETCH_CODES = 32
+WARM_UP_BUDGET = 10
+
+
+class UsageStats:
+    """Usage counts of string commands, persisted in HA storage."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._store = Store(hass, STORAGE_VERSION, STORAGE_KEY)
+        self._counts: Counter = Counter()
+        self._loaded = False
+
+    async def async_load(self) -> None:
+        if not self._loaded:
+            self._counts.update(await self._store.async_load() or {})
+            self._loaded = True
+
+    def record(self, command: str) -> None:
+        self._counts[command] += 1
+        self._store.async_delay_save(self._data_to_save, SAVE_DELAY)
+
+    def most_common(self, count: int) -> List[str]:
+        return [command for command, _ in self._counts.most_common(count)]
+
+    def _data_to_save(self) -> Dict[str, int]:
+        return dict(self._counts.most_common(MAX_COMMANDS))
+
+
+def get_usage_stats(hass: HomeAssistant) -> UsageStats:
+    """Return usage statistics shared by all remotes."""
+    return hass.data.setdefault(DOMAIN, {}).setdefault(DATA_USAGE, UsageStats(hass))
+
+
+async def async_warm_up(
+    hass: HomeAssistant, remotes: Iterable[Any], budget: float = WARM_UP_BUDGET
+) -> None:
+    """Subscribe devices and prefetch the most used codes of remotes.
+
+    Runs in background within the time budget, whatever is not done in time
+    is left for the first command.
+    """
+    start_time = time.monotonic()
+
+    usage = get_usage_stats(hass)
+    await usage.async_load()
+    commands = usage.most_common(PREFETCH_CODES)
+
+    tasks = [
+        asyncio.ensure_future(remote.async_warm_up(commands)) for remote in remotes
+    ]
+    if not tasks:
+        return
+
+    done, pending = await asyncio.wait(tasks, timeout=budget)
+    for task in pending:
+        task.cancel()
+
+    _LOGGER.info(
+        "Warmed up %d of %d AllOne remotes with %d codes in %.2f sec",
+        sum(1 for task in done if not task.exception() and task.result()),
+        len(tasks),
+        len(commands),
+        time.monotonic() - start_time,
+    )
@@ -0,0 +1,119 @@
+"""Microbenchmarks of protocol codec hot paths.
+
+Throughput is measured relative to a reference pure Python workload run on
+the same machine, so stored baseline doesn't depend much on the hardware.
+Benchmark fails if relative throughput drops below the baseline by more than
+ORVIBO_BENCH_THRESHOLD (0.5 by default) and if it has no baseline. Run with
+ORVIBO_BENCH_UPDATE=1 to store new baseline, it is never written otherwise.
+"""
+import json
+import os
+import random
+import timeit
+from base64 import b64encode
+from pathlib import Path
+
+import pytest
+from custom_components.orvibo_remote.orvibo.orvibo import (
+    BLAST_IR,
+    DISCOVER_RESP,
+    MAGIC,
+    SPACES_6,
+    Packet,
+    _debug_data,
+    _parse_discover_response,
+    _random_n_bytes,
+    _reverse_bytes,
+)
+from custom_components.orvibo_remote.remote import OrviboRemote
+
+BASELINE_FILE = Path(__file__).with_name("baseline.json")
+THRESHOLD = float(os.environ.get("ORVIBO_BENCH_THRESHOLD", "0.5"))
+UPDATE = os.environ.get("ORVIBO_BENCH_UPDATE") == "1"
+
+MAC = bytes.fromhex("accf23551e7a")
+
+# Typical TV button and long AC state code
+_random = random.Random(42)
+SIGNALS = {
+    "tv": bytes(_random.getrandbits(8) for _ in range(136)),
+    "ac": bytes(_random.getrandbits(8) for _ in range(620)),
+}
+
+DISCOVER_RESPONSE = (
+    MAGIC
+    + b"\x00\x2a"
+    + DISCOVER_RESP
+    + b"\x00"
+    + MAC
+    + SPACES_6
+    + _reverse_bytes(MAC)
+    + SPACES_6
+    + b"IRD005"
+    + b"\x00" * 8
+)
+
+
+def _emit_packet(signal):
+    return Packet("192.168.1.20").compile(
+        BLAST_IR, MAC, SPACES_6, b"\x65\x00\x00\x00", b"\x01\x02", signal
+    )
+
+
+def _benchmarks():
+    benchmarks = {
+        "reverse_bytes": lambda: _reverse_bytes(MAC),
+        "random_n_bytes": lambda: _random_n_bytes(7),
+        "parse_discover_response": lambda: _parse_discover_response(DISCOVER_RESPONSE),
+    }
+    for name, signal in SIGNALS.items():
+        packet_data = _emit_packet(signal).data
+        command = "b64:" + b64encode(signal).decode()
+
+        benchmarks["compile_" + name] = lambda s=signal: _emit_packet(s)
+        benchmarks["debug_data_" + name] = lambda d=packet_data: _debug_data(d)
+        benchmarks["decode_command_" + name] = (
+            lambda c=command: OrviboRemote._decode_command(None, c)
+        )
+    return benchmarks
+
+
+BENCHMARKS = _benchmarks()
+
+
+def _time_per_call(func):
+    number = 1
+    while timeit.timeit(func, number=number) < 0.01:
+        number *= 2
+    return min(timeit.repeat(func, number=number, repeat=3)) / number
+
+
+def _reference():
+    return sum(i * i for i in range(100))
+
+
+def _relative_throughput(func):
+    # Reference is measured around the benchmark to follow CPU frequency changes
+    times = []
+    for _ in range(3):
+        times.append(_time_per_call(_reference) / _time_per_call(func))
+    return sorted(times)[1]
+
+
+@pytest.mark.parametrize("name", sorted(BENCHMARKS))
+def test_benchmark(name):
+    throughput = _relative_throughput(BENCHMARKS[name])
+
+    baseline = json.loads(BASELINE_FILE.read_text()) if BASELINE_FILE.exists() else {}
+    if UPDATE:
+        baseline[name] = round(throughput, 3)
+        BASELINE_FILE.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        return
+
+    if name not in baseline:
+        pytest.fail("{} has no baseline, store it with ORVIBO_BENCH_UPDATE=1".format(name))
+    assert throughput >= baseline[name] * (1 - THRESHOLD), (
+        "{} throughput {:.3f} dropped below baseline {:.3f}".format(
+            name, throughput, baseline[name]
+        )
+    )
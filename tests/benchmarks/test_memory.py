@@ -0,0 +1,50 @@
+"""Memory footprint of simulated device registries.
+
+Every simulated device is an Orvibo object which has logged once, with its
+last compiled packet. Footprint per device must stay within the budget and
+must not grow with the number of devices.
+"""
+import logging
+import tracemalloc
+
+import pytest
+from custom_components.orvibo_remote.orvibo.orvibo import (
+    BLAST_IR,
+    BLAST_IR_FLAGS,
+    SPACES_6,
+    Orvibo,
+    Packet,
+)
+
+MAX_BYTES_PER_DEVICE = 512
+
+
+def _registry(count):
+    registry = []
+    for indx in range(count):
+        ip = "10.{}.{}.{}".format(indx >> 16 & 255, indx >> 8 & 255, indx & 255)
+        device = Orvibo(ip, "accf23{:06x}".format(indx), Orvibo.TYPE_IRDA)
+        device._Orvibo__logger.debug("Simulated")
+        packet = Packet(ip).compile(BLAST_IR, device.mac, SPACES_6, BLAST_IR_FLAGS)
+        registry.append((device, packet))
+    return registry
+
+
+@pytest.mark.parametrize("count", [1000, 10000])
+def test_memory_per_device(count):
+    loggers = len(logging.Logger.manager.loggerDict)
+
+    tracemalloc.start()
+    try:
+        registry = _registry(count)
+        size = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+    per_device = size / len(registry)
+    assert per_device <= MAX_BYTES_PER_DEVICE, (
+        "{} devices take {:.0f} bytes each, budget is {}".format(
+            count, per_device, MAX_BYTES_PER_DEVICE
+        )
+    )
+    assert len(logging.Logger.manager.loggerDict) == loggers
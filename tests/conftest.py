@@ -0,0 +1,53 @@
+import socket
+import threading
+
+import pytest
+from custom_components.orvibo_remote.orvibo.orvibo import PORT
+
+
+class FakeAllOne:
+    """Answers every request, by default with a response of the same command."""
+
+    def __init__(self, ip, response=None):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((ip, PORT))
+        self.response = response
+        self.requests = []
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                data, addr = self.sock.recvfrom(2048)
+                if addr is None:
+                    # Socket is shut down
+                    break
+                self.requests.append(data[4:6])
+                response = self.response
+                if response is None:
+                    response = data[:6] + b"\x00" * 10 + b"\x01"
+                self.sock.sendto(response, addr)
+            except OSError:
+                break
+
+    def close(self):
+        try:
+            # Wakes up the serving thread
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+@pytest.fixture
+def fake_allone():
+    """Starts fake AllOne devices, fake_allone(ip, response=None)."""
+    fakes = []
+
+    def start(ip, response=None):
+        fakes.append(FakeAllOne(ip, response))
+        return fakes[-1]
+
+    yield start
+    for fake in fakes:
+        fake.close()
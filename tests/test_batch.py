@@ -0,0 +1,85 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+from custom_components.orvibo_remote.orvibo.orvibo import (
+    OrviboException,
+    load_batch_plan,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _write(path, content):
+    path.write_text(content)
+    return str(path)
+
+
+class TestBatch:
+    def test_load_script(self, tmp_path):
+        plan = load_batch_plan(
+            _write(
+                tmp_path / "plan.txt",
+                "# living room\n"
+                "192.168.1.20 emit b64:AAEC\n"
+                "\n"
+                "accf23000001 learn tv.ir  # learn to file\n"
+                "192.168.1.21 state\n",
+            )
+        )
+
+        assert [1, 2, 3] == [command["index"] for command in plan]
+        assert ["emit", "learn", "state"] == [command["action"] for command in plan]
+        assert "b64:AAEC" == plan[0]["code"]
+        assert plan[2]["code"] is None
+
+    @pytest.mark.parametrize(
+        "plan, error",
+        [
+            ('[{"action": "state"}]', "Missing target in command #1"),
+            ('[{"target": "", "action": "state"}]', "Missing target in command #1"),
+            ('["192.168.1.20 state"]', "Command #1 is not an object"),
+            ("192.168.1.20 state\n192.168.1.20 blink", "Unknown action blink"),
+            ("192.168.1.20", "Unknown action None in command #1"),
+            ('[{"target": "192.168.1.20", "action": "emit"}]', "Missing code for emit"),
+            ("192.168.1.20 state\n192.168.1.20 rf-on", "Missing code for rf-on"),
+        ],
+    )
+    def test_load_invalid(self, tmp_path, plan, error):
+        with pytest.raises(OrviboException, match=error):
+            load_batch_plan(_write(tmp_path / "plan", plan))
+
+    def test_cli(self, tmp_path, fake_allone):
+        plan = _write(
+            tmp_path / "plan.txt",
+            "127.0.0.31 emit b64:AAEC\n"
+            "accf23000032 emit hex:000102\n"
+            "127.0.0.33 emit b64:AAEC\n",
+        )
+        cache = _write(
+            tmp_path / "devices.json",
+            json.dumps(
+                {
+                    "accf23000031": ["127.0.0.31", "irda"],
+                    "accf23000032": ["127.0.0.32", "irda"],
+                    "accf23000033": ["127.0.0.33", "irda"],
+                }
+            ),
+        )
+        fakes = [fake_allone("127.0.0.31"), fake_allone("127.0.0.32")]
+        process = subprocess.run(
+            [sys.executable, "-m", "custom_components.orvibo_remote.orvibo.orvibo"]
+            + ["-b", plan, "-c", cache, "-w", "2"],
+            cwd=ROOT,
+            capture_output=True,
+            timeout=30,
+        )
+
+        report = json.loads(process.stdout)
+        assert 1 == process.returncode
+        assert not report["ok"]
+        assert [True, True, False] == [result["ok"] for result in report["results"]]
+        assert "127.0.0.31" == report["results"][0]["target"]
+        assert all(b"ic" in fake.requests for fake in fakes)
@@ -0,0 +1,97 @@
+import base64
+import threading
+
+import pytest
+from custom_components.orvibo_remote.orvibo.bridge import (
+    Bridge,
+    BridgeClient,
+    create_server,
+)
+from custom_components.orvibo_remote.orvibo.link import DeviceLink
+from custom_components.orvibo_remote.orvibo.orvibo import Orvibo, OrviboException
+from custom_components.orvibo_remote.session import DeviceSession
+
+MAC = bytes.fromhex("accf23000041")
+
+
+@pytest.fixture
+def bridge_url(tmp_path, monkeypatch):
+    monkeypatch.setattr(
+        Orvibo,
+        "discover",
+        staticmethod(lambda: {"127.0.0.41": ("127.0.0.41", MAC, Orvibo.TYPE_IRDA)}),
+    )
+    path = str(tmp_path / "bridge.sock")
+    bridge = Bridge(workers=2)
+    server = create_server(bridge, unix_path=path)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield "unix://" + path
+    server.shutdown()
+    server.server_close()
+    bridge.close()
+
+
+class TestBridge:
+    def test_unix_socket(self, bridge_url, fake_allone):
+        fake = fake_allone("127.0.0.41")
+        client = BridgeClient(bridge_url)
+        assert {} == client.devices()
+        devices = client.devices(rediscover=True)
+        assert {"127.0.0.41": ("127.0.0.41", MAC, "irda")} == devices
+        assert devices == client.devices()
+
+        assert client.emit_ir(MAC, b"signal")
+        results = client.batch(
+            [
+                {"mac": MAC.hex(), "signal": base64.b64encode(b"a").decode()},
+                {"mac": "accf23000099", "signal": ""},
+                {"mac": MAC.hex(), "action": "blink"},
+            ]
+        )
+
+        assert [True, False, False] == [result["ok"] for result in results]
+        assert "not known" in results[1]["error"]
+        assert "Unknown action blink" == results[2]["error"]
+        assert b"ic" in fake.requests
+
+        assert not client.emit_ir(bytes(6), b"signal")
+        with pytest.raises(OrviboException, match="Not found"):
+            client._request("GET", "/nothing")
+
+    def test_sessions_are_shared_with_integration(self, monkeypatch):
+        monkeypatch.setattr(
+            Orvibo,
+            "discover",
+            staticmethod(lambda: {"127.0.0.42": ("127.0.0.42", MAC, "irda")}),
+        )
+        bridge = Bridge(workers=1)
+        try:
+            bridge.discover()
+            assert isinstance(bridge._session(MAC.hex()), DeviceLink)
+            assert issubclass(DeviceSession, DeviceLink)
+        finally:
+            bridge.close()
+
+    def test_invalid_payload(self, bridge_url):
+        client = BridgeClient(bridge_url)
+        for payload in [{"mac": MAC.hex()}, "emit", [["emit"]]]:
+            with pytest.raises(OrviboException, match="Batch must be a list"):
+                client.batch(payload)
+        with pytest.raises(OrviboException, match="Command must be an object"):
+            client._request("POST", "/emit", ["emit"])
+
+    def test_device_errors(self, bridge_url, monkeypatch):
+        client = BridgeClient(bridge_url)
+        client.devices(rediscover=True)
+
+        def fail(*args):
+            raise OSError("Network is unreachable")
+
+        monkeypatch.setattr(Orvibo, "emit_ir", fail)
+        monkeypatch.setattr(Orvibo, "discover", staticmethod(fail))
+
+        assert not client.emit_ir(MAC, b"signal")
+        results = client.batch([{"mac": MAC.hex(), "signal": ""}])
+        assert "Network is unreachable" == results[0]["error"]
+        with pytest.raises(OrviboException, match="Network is unreachable"):
+            client.devices(rediscover=True)
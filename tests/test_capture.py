@@ -0,0 +1,101 @@
+import socket
+
+import pytest
+from custom_components.orvibo_remote.orvibo import orvibo
+from custom_components.orvibo_remote.orvibo.capture import (
+    Recorder,
+    ReplayDevice,
+    read_capture,
+)
+from custom_components.orvibo_remote.orvibo.orvibo import (
+    BLAST_IR,
+    PACKET_RECEIVED,
+    PACKET_SENT,
+    PORT,
+    SUBSCRIBE,
+    OrviboException,
+    Packet,
+)
+
+
+class TestCapture:
+    def test_record_read(self, tmp_path):
+        fname = str(tmp_path / "capture.bin")
+        request = Packet("192.168.1.20").compile(SUBSCRIBE, b"\xf2" * 6).data
+
+        with Recorder(fname):
+            orvibo._observe(PACKET_SENT, "192.168.1.20", request)
+            orvibo._observe(PACKET_RECEIVED, "192.168.1.20", request + b"\x01")
+        orvibo._observe(PACKET_SENT, "192.168.1.20", request)
+
+        records = read_capture(fname)
+
+        assert [PACKET_SENT, PACKET_RECEIVED] == [r.direction for r in records]
+        assert ["192.168.1.20"] * 2 == [r.ip for r in records]
+        assert [request, request + b"\x01"] == [r.data for r in records]
+        assert records[0].time <= records[1].time
+        assert [] == orvibo.packet_observers
+
+    def test_replay_responses(self, tmp_path):
+        fname = str(tmp_path / "capture.bin")
+        subscribe = Packet("192.168.1.20").compile(SUBSCRIBE, b"\xf2" * 6).data
+        blast = Packet("192.168.1.20").compile(BLAST_IR, b"\xf2" * 6).data
+
+        with Recorder(fname):
+            orvibo._observe(PACKET_SENT, "192.168.1.20", subscribe)
+            orvibo._observe(PACKET_RECEIVED, "192.168.1.20", subscribe + b"\x01")
+            orvibo._observe(PACKET_RECEIVED, "192.168.1.30", b"noise")
+            orvibo._observe(PACKET_SENT, "192.168.1.20", blast)
+            orvibo._observe(PACKET_SENT, "192.168.1.20", subscribe)
+
+        device = ReplayDevice(read_capture(fname))
+
+        assert [subscribe + b"\x01"] == [r for _, r in device.responses_for(subscribe)]
+        # Lost response is replayed as loss
+        assert [] == device.responses_for(blast)
+        assert [] == device.responses_for(subscribe)
+        assert [] == device.responses_for(b"hd\x00\x06\x00\x00")
+
+    def test_replay_socket(self, tmp_path):
+        fname = str(tmp_path / "capture.bin")
+        subscribe = Packet("192.168.1.20").compile(SUBSCRIBE, b"\xf2" * 6).data
+
+        with Recorder(fname):
+            orvibo._observe(PACKET_SENT, "192.168.1.20", subscribe)
+            orvibo._observe(PACKET_RECEIVED, "192.168.1.20", subscribe + b"\x01")
+
+        device = ReplayDevice(read_capture(fname), ip="127.0.0.51", speed=100)
+        device.start()
+        thread = device._thread
+        client = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        client.settimeout(2)
+        try:
+            client.sendto(subscribe, ("127.0.0.51", PORT))
+            assert (subscribe + b"\x01", ("127.0.0.51", PORT)) == client.recvfrom(1024)
+        finally:
+            client.close()
+            device.stop()
+
+        assert not thread.is_alive()
+        # Port is free again, even for sockets without SO_REUSEADDR
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.bind(("127.0.0.51", PORT))
+        sock.close()
+
+    def test_read_invalid(self, tmp_path):
+        fname = str(tmp_path / "capture.bin")
+        with Recorder(fname):
+            orvibo._observe(PACKET_SENT, "192.168.1.20", b"request")
+        content = open(fname, "rb").read()
+
+        for invalid, error in [
+            (b"", "not a capture file"),
+            (content[:6], "not a capture file"),
+            (b"PCAP" + content[4:], "not a capture file"),
+            (content[:-8], "truncated at 7"),
+            (content[:-3], "truncated at 22"),
+        ]:
+            with open(fname, "wb") as f:
+                f.write(invalid)
+            with pytest.raises(OrviboException, match=error):
+                read_capture(fname)
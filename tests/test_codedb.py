@@ -0,0 +1,75 @@
+from unittest.mock import MagicMock
+
+import pytest
+from custom_components.orvibo_remote.codedb import CodeDatabase, build_code_database
+from custom_components.orvibo_remote.remote import _async_get_code_database
+
+
+@pytest.fixture
+def code_db(tmp_path):
+    path = str(tmp_path / "codes.db")
+    build_code_database(
+        path,
+        [
+            ("Samsung", "UE40", "power", b"samsung power"),
+            ("Samsung", "UE40", "volume_up", b"samsung volume up"),
+            ("Samsung", "UE40X", "power", b"samsung x power"),
+            ("LG", "42LB", "power", b"lg power"),
+        ],
+    )
+    with CodeDatabase(path) as db:
+        yield db
+
+
+class TestCodeDatabase:
+    def test_get(self, code_db):
+        assert 4 == len(code_db)
+        assert b"samsung power" == code_db.get("Samsung", "UE40", "power")
+        assert b"lg power" == code_db.get("lg", "42lb", "POWER")
+        assert code_db.get("Samsung", "UE40", "mute") is None
+        assert code_db.get("Sony", "KD", "power") is None
+
+    def test_keys(self, code_db):
+        assert [
+            ("samsung", "ue40", "power"),
+            ("samsung", "ue40", "volume_up"),
+        ] == list(code_db.keys("Samsung", "UE40"))
+        assert 3 == len(list(code_db.keys("samsung")))
+        assert 4 == len(list(code_db.keys()))
+
+    def test_not_database(self, tmp_path):
+        path = tmp_path / "codes.json"
+        path.write_text("{}" + " " * 32)
+
+        with pytest.raises(ValueError):
+            CodeDatabase(str(path))
+
+    def test_truncated(self, tmp_path):
+        path = tmp_path / "codes.db"
+        build_code_database(str(path), [("LG", "42LB", "power", b"lg power")])
+        content = path.read_bytes()
+
+        for truncated, error in [
+            (b"", "empty file"),
+            (content[:10], "not an IR code database"),
+            (content[:-1], "truncated"),
+        ]:
+            path.write_bytes(truncated)
+            with pytest.raises(ValueError, match=error):
+                CodeDatabase(str(path))
+
+    @pytest.mark.asyncio
+    async def test_closed_on_stop(self, tmp_path):
+        path = str(tmp_path / "codes.db")
+        build_code_database(path, [("LG", "42LB", "power", b"lg power")])
+        hass = MagicMock()
+        hass.data = {}
+
+        code_db = await _async_get_code_database(hass, path)
+        assert code_db is await _async_get_code_database(hass, path)
+        assert b"lg power" == code_db.get("lg", "42lb", "power")
+
+        hass.bus.async_listen_once.assert_called_once()
+        await hass.bus.async_listen_once.call_args[0][1](None)
+        with pytest.raises(ValueError):
+            code_db.get("lg", "42lb", "power")
@@ -0,0 +1,74 @@
+import pytest
+import voluptuous as vol
+from custom_components.orvibo_remote import remote, switch
+from custom_components.orvibo_remote.orvibo import orvibo
+from custom_components.orvibo_remote.orvibo.orvibo import (
+    DISCOVER_RESP,
+    MAGIC,
+    SPACES_6,
+    Orvibo,
+    _discover_shards,
+    _reverse_bytes,
+)
+
+
+def _discover_response(mac):
+    return (
+        MAGIC
+        + b"\x00\x2a"
+        + DISCOVER_RESP
+        + b"\x00"
+        + mac
+        + SPACES_6
+        + _reverse_bytes(mac)
+        + SPACES_6
+        + b"IRD005"
+        + b"\x00" * 8
+    )
+
+
+class TestDiscovery:
+    def test_shards(self):
+        shards = _discover_shards(["10.0.0.0/29", "10.0.0.4/30", "10.0.1.1"], 4)
+        assert [
+            ["10.0.0.1", "10.0.0.2", "10.0.0.3", "10.0.0.4"],
+            ["10.0.0.5", "10.0.0.6"],
+            ["10.0.1.1"],
+        ] == shards
+        assert 1 == len(_discover_shards(["10.0.0.0/29", "10.0.1.1"]))
+
+    def test_sharded_sweep(self, monkeypatch, fake_allone):
+        monkeypatch.setattr(orvibo, "DISCOVER_SHARD_SIZE", 2)
+        for indx in (2, 5, 6):
+            fake_allone(
+                "127.0.0.{}".format(indx),
+                _discover_response(bytes([0xAC, 0xCF, 0x23, 0, 0, indx])),
+            )
+
+        found = Orvibo.discover_subnets(
+            ["127.0.0.0/29"], rate=10000, timeout=0.2, workers=3
+        )
+
+        assert ["127.0.0.2", "127.0.0.5", "127.0.0.6"] == sorted(found)
+        assert Orvibo.TYPE_IRDA == found["127.0.0.5"][2]
+
+    @pytest.mark.parametrize("platform", [remote, switch])
+    def test_subnets_are_validated(self, platform):
+        config = {"platform": "orvibo_remote"}
+        if platform is switch:
+            config["switches"] = {"lamp": {}}
+
+        subnets = ["10.0.4.0/22", "10.0.8.1/24", "10.0.1.1"]
+        validated = platform.PLATFORM_SCHEMA(dict(config, discovery_subnets=subnets))
+        assert subnets == validated["discovery_subnets"]
+        validated = platform.PLATFORM_SCHEMA(
+            dict(config, discovery_subnets="10.0.4.0/22")
+        )
+        assert ["10.0.4.0/22"] == validated["discovery_subnets"]
+
+        for subnet in ("10.0.4.0/33", "iot.lan", "fe80::/64"):
+            with pytest.raises(vol.Invalid, match="Invalid network"):
+                platform.PLATFORM_SCHEMA(dict(config, discovery_subnets=[subnet]))
+        for subnet in ("10.0.0.0/8", "10.0.0.0/21"):
+            with pytest.raises(vol.Invalid, match="too large, split it into /22"):
+                platform.PLATFORM_SCHEMA(dict(config, discovery_subnets=[subnet]))
@@ -0,0 +1,58 @@
+import struct
+from base64 import b64decode
+
+from custom_components.orvibo_remote.ircode import SignalIndex, normalize
+
+HEADER = b"\x00" * 4 + b"\x88\x00" + b"\x00" * 8
+
+# Learned by AllOne, as in services.yaml example
+LEARNED = b64decode(
+    "iAAAAAAAiAAAAAAAAAAAAHgAViH6D90BEwa4ATYCzgEiAs0BIgK4ASkGzgEhAs4"
+    "BIQLOASQCtQEsBs0BzwX8ATcCzQEhAs8BIQK4ATgCtgE4As0BIQLNASICzQElArcBNQ"
+    "LNASICzgEhAs0BFga3ATYCzQEWBrcBNwLNASICzAEjAs4BEwbOAQAA"
+)
+
+
+def _signal(timings, padding=b"", count=None):
+    size = 2 * len(timings)
+    body = (
+        HEADER
+        + struct.pack("<H", size if count is None else count)
+        + struct.pack("<{}H".format(len(timings)), *timings)
+    )
+    return struct.pack("<H", len(body)) + body + padding
+
+
+class TestSignal:
+    def test_normalize(self):
+        learned = _signal([560, 1690, 540, 560, 1710, 560, 40000], b"\x00\x00\x13")
+        learned_again = _signal([565, 1700, 555, 560, 1680, 545, 39800])
+
+        assert normalize(learned) == normalize(learned_again)
+        assert _signal([560, 1700, 560, 560, 1700, 560, 40000]) == normalize(learned)
+
+    def test_normalize_learned(self):
+        normalized = normalize(LEARNED)
+
+        assert LEARNED[:18] == normalized[:18]
+        assert len(LEARNED) == len(normalized)
+        assert normalized == normalize(LEARNED + b"\x00\x13")
+
+    def test_normalize_other_layout(self):
+        assert b"\x01\x02\x03" == normalize(b"\x01\x02\x03")
+        assert b"\xff\x00" + b"\x00" * 20 == normalize(b"\xff\x00" + b"\x00" * 20)
+
+        inconsistent = _signal([565, 1700, 555], count=4)
+        assert inconsistent == normalize(inconsistent)
+
+    def test_index(self):
+        index = SignalIndex()
+        index.add("power", normalize(_signal([560, 1690, 560, 560, 40000])))
+        index.add("mute", normalize(_signal([560, 560, 560, 1690, 40000])))
+
+        assert "power" == index.find(normalize(_signal([550, 1700, 570, 555, 39000])))
+        # Durations close to cluster boundary get other fingerprint
+        assert "power" == index.find(_signal([560, 1450, 560, 560, 40000]))
+        assert index.find(_signal([560, 1690, 560, 1690, 40000])) is None
+        assert index.find(_signal([560, 1690, 560])) is None
+        assert index.find(b"raw") is None
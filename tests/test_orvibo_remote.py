@@ -1,14 +1,56 @@
+import asyncio
+import os
+import sys
+import time
+
 import pytest
-from unittest.mock import MagicMock
+import voluptuous as vol
+from unittest.mock import AsyncMock, MagicMock, patch
+from custom_components.orvibo_remote import async_remove_entry, async_unload_entry
+from custom_components.orvibo_remote import remote as remote_module
+from custom_components.orvibo_remote import switch
+from custom_components.orvibo_remote import session as session_module
+from custom_components.orvibo_remote.cache import CodeCache
+from custom_components.orvibo_remote.codedb import CodeDatabase, build_code_database
+from custom_components.orvibo_remote.const import (
+    DATA_DEVICES,
+    DATA_ENTRY_SESSIONS,
+    DATA_USAGE,
+    DOMAIN,
+)
 from custom_components.orvibo_remote.orvibo.orvibo import Orvibo
+from custom_components.orvibo_remote.profiler import (
+    MODE_DETERMINISTIC,
+    MODE_SAMPLING,
+    async_profile,
+)
 from custom_components.orvibo_remote.remote import OrviboRemote
+from custom_components.orvibo_remote.scheduler import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    PriorityScheduler,
+)
+from custom_components.orvibo_remote.session import (
+    BACKGROUND_SUBSCRIBE_TIMEOUT,
+    MAX_WORKERS,
+    DeviceSession,
+    async_get_devices,
+    get_session,
+)
+from custom_components.orvibo_remote.switch import OrviboRF433Switch, OrviboRF433SwitchGroup
+from custom_components.orvibo_remote.warmup import async_warm_up
+from homeassistant.exceptions import HomeAssistantError
+
+
+class MockedOrvibo(Orvibo):
+    """Orvibo without __slots__, so methods can be mocked per instance."""
 
 
 class TestArguments:
     @pytest.mark.asyncio
     async def test_async_send_command_none(self):
         mocked_name = "Test intance"
-        mocked_device = Orvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
         mocked_device.emit_ir = MagicMock(return_value=b"any")
 
         mocked_command = []
@@ -21,7 +63,7 @@ class TestArguments:
     @pytest.mark.asyncio
     async def test_async_send_command_single(self):
         mocked_name = "Test intance"
-        mocked_device = Orvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
         mocked_device.emit_ir = MagicMock(return_value=b"any")
 
         mocked_command = [
@@ -37,7 +79,7 @@ class TestArguments:
     @pytest.mark.asyncio
     async def test_async_send_command_few_commands(self):
         mocked_name = "Test intance"
-        mocked_device = Orvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
         mocked_device.emit_ir = MagicMock(return_value=b"any")
 
         mocked_command = [
@@ -63,7 +105,7 @@ class TestFormats:
     @pytest.mark.asyncio
     async def test_boardlink_format(self):
         mocked_name = "Test intance"
-        mocked_device = Orvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
         mocked_device.emit_ir = MagicMock(return_value=b"any")
 
         mocked_command = [
@@ -88,7 +130,7 @@ class TestFormats:
     @pytest.mark.asyncio
     async def test_raw(self):
         mocked_name = "Test intance"
-        mocked_device = Orvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
         mocked_device.emit_ir = MagicMock(return_value=b"any")
 
         expected_result = bytes.fromhex(
@@ -104,3 +146,483 @@ class TestFormats:
         await instance.async_send_command(command=[expected_result])
 
         mocked_device.emit_ir.assert_called_once_with(expected_result)
+
+    @pytest.mark.asyncio
+    async def test_code_database(self, tmp_path):
+        mocked_name = "Test intance"
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=b"any")
+
+        path = str(tmp_path / "codes.db")
+        build_code_database(path, [("Samsung", "UE40", "power", b"test1")])
+
+        with CodeDatabase(path) as code_db:
+            instance = OrviboRemote(mocked_name, mocked_device, code_db=code_db)
+            await instance.async_send_command(command=["db:samsung/ue40/power"])
+
+            with pytest.raises(ValueError):
+                await instance.async_send_command(command=["db:samsung/ue40/mute"])
+
+        mocked_device.emit_ir.assert_called_once_with(b"test1")
+
+
+class TestSession:
+    @pytest.mark.asyncio
+    async def test_device_calls_are_serialized(self):
+        active = []
+        overlaps = []
+
+        def blocking_emit(signal):
+            active.append(signal)
+            if len(active) > 1:
+                overlaps.append(signal)
+            time.sleep(0.01)
+            active.remove(signal)
+            return True
+
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(side_effect=blocking_emit)
+
+        session = DeviceSession(mocked_device)
+        await asyncio.gather(*[session.async_emit_ir(b"%d" % i) for i in range(5)])
+
+        assert 5 == mocked_device.emit_ir.call_count
+        assert [] == overlaps
+
+
+class TestRF433:
+    def test_wake_up_only_when_idle(self):
+        device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        device.emit_ir = MagicMock(return_value=True)
+
+        device._wake_up_rf433()
+        device._Orvibo__last_wake_up_time = time.time()
+        device._wake_up_rf433()
+
+        device.emit_ir.assert_called_once_with(b" ")
+
+    @pytest.mark.asyncio
+    async def test_group_switches_in_single_batch(self):
+        device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        device.emit_rf433_many = MagicMock()
+        session = DeviceSession(device)
+
+        switches = [
+            OrviboRF433Switch("Switch %d" % i, str(i), b"key%04d" % i, session)
+            for i in range(3)
+        ]
+        group = OrviboRF433SwitchGroup("All", "f2ffffffffff", switches, session)
+        await group.async_turn_on()
+
+        device.emit_rf433_many.assert_called_once_with(
+            True, [b"key0000", b"key0001", b"key0002"]
+        )
+        assert all(switch.is_on for switch in switches)
+
+    def test_key_is_validated(self):
+        config = {"platform": "orvibo_remote", "switches": {"lamp": {"key": "00112233AABBcc"}}}
+        assert "00112233AABBcc" == switch.PLATFORM_SCHEMA(config)["switches"]["lamp"]["key"]
+
+        for key in ("0011223344556", "001122334455667", "00112233aabbzz"):
+            config["switches"]["lamp"]["key"] = key
+            with pytest.raises(vol.Invalid, match="Key must be 7 bytes in hex"):
+                switch.PLATFORM_SCHEMA(config)
+
+class TestSessionCache:
+    def test_session_survives_entities(self):
+        hass = MagicMock()
+        hass.data = {}
+
+        device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        first = get_session(hass, device)
+        # Entities are rebuilt with new device objects on config entry reload
+        device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        second = get_session(hass, device)
+
+        assert first is second
+        hass.bus.async_listen_once.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_decoded_commands_are_cached(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=b"any")
+
+        code_cache = CodeCache(max_codes=1)
+        instance = OrviboRemote("Test intance", mocked_device, code_cache=code_cache)
+        await instance.async_send_command(command=["b64:dGVzdDE=", "b64:dGVzdDI="])
+
+        assert "b64:dGVzdDE=" not in code_cache
+        assert "b64:dGVzdDI=" in code_cache
+        mocked_device.emit_ir.assert_called_with(b"test2")
+
+    @pytest.mark.asyncio
+    async def test_empty_discovery_is_not_cached(self, monkeypatch):
+        hass = MagicMock()
+        hass.data = {}
+        results = [{}, {"127.0.0.1": ("127.0.0.1", b"\xf2" * 6, Orvibo.TYPE_IRDA)}]
+        discover = AsyncMock(side_effect=results)
+        monkeypatch.setattr(session_module, "async_discover", discover)
+
+        assert {} == await async_get_devices(hass)
+        assert results[1] == await async_get_devices(hass)
+        assert results[1] == await async_get_devices(hass)
+        assert 2 == discover.await_count
+
+    @pytest.mark.asyncio
+    async def test_cancelled_discovery_is_not_cached(self, monkeypatch):
+        hass = MagicMock()
+        hass.data = {}
+        release = asyncio.Event()
+
+        async def discover(client, subnets, workers):
+            await release.wait()
+            return {"127.0.0.1": ("127.0.0.1", b"\xf2" * 6, Orvibo.TYPE_IRDA)}
+
+        monkeypatch.setattr(session_module, "async_discover", discover)
+
+        caller = asyncio.ensure_future(async_get_devices(hass))
+        await asyncio.sleep(0)
+        caller.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await caller
+        assert {} == hass.data[DOMAIN][DATA_DEVICES]
+
+        release.set()
+        assert 1 == len(await async_get_devices(hass))
+
+    @pytest.mark.asyncio
+    async def test_reload_keeps_socket(self):
+        hass = MagicMock()
+        hass.data = {}
+        hass.config_entries.async_forward_entry_unload = AsyncMock(return_value=True)
+        hass.async_add_executor_job = lambda func: asyncio.get_running_loop().run_in_executor(None, func)
+        entry = MagicMock(entry_id="entry", data={}, options={})
+        remotes = []
+
+        async def setup_platform(hass, config, async_add_entities):
+            # Entities are rebuilt with new device objects on reload
+            device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+            remotes.append(OrviboRemote("Test intance", device, get_session(hass, device)))
+            async_add_entities(remotes[-1:])
+
+        sock = MagicMock()
+        with patch.object(remote_module, "async_setup_platform", setup_platform):
+            await remote_module.async_setup_entry(hass, entry, MagicMock())
+            remotes[0].session.device._Orvibo__socket = sock
+            assert await async_unload_entry(hass, entry)
+            await remote_module.async_setup_entry(hass, entry, MagicMock())
+
+        assert remotes[0].session is remotes[1].session
+        assert remotes[1].session.device.keep_connection
+        sock.close.assert_not_called()
+
+        await async_remove_entry(hass, entry)
+        sock.close.assert_called_once()
+        assert not remotes[1].session.device.keep_connection
+        assert {} == hass.data[DOMAIN][DATA_ENTRY_SESSIONS]
+
+class TestWarmUp:
+    @pytest.mark.asyncio
+    async def test_warm_up(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        session = DeviceSession(mocked_device)
+        session.async_connect = AsyncMock(return_value=True)
+
+        code_cache = CodeCache()
+        instance = OrviboRemote("Test intance", mocked_device, session, code_cache=code_cache)
+
+        assert await instance.async_warm_up(["b64:dGVzdDE=", "db:unknown/code/here"])
+        assert "b64:dGVzdDE=" in code_cache
+        session.async_connect.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_emit_after_warm_up_is_not_subscribed(self, fake_allone):
+        fake = fake_allone("127.0.0.61")
+        device = Orvibo("127.0.0.61", "accf23000061", Orvibo.TYPE_IRDA)
+        session = DeviceSession(device, keep_connection=True)
+        try:
+            assert await session.async_connect()
+            assert b"cl" in fake.requests
+            fake.requests.clear()
+
+            assert await session.async_emit_ir(b"test1")
+        finally:
+            session.close()
+
+        assert b"ic" in fake.requests
+        assert b"cl" not in fake.requests
+
+    @pytest.mark.asyncio
+    async def test_budget(self):
+        usage = MagicMock(async_load=AsyncMock())
+        usage.most_common.return_value = ["b64:dGVzdDE="]
+        hass = MagicMock()
+        hass.data = {DOMAIN: {DATA_USAGE: usage}}
+
+        async def sleep(commands):
+            await asyncio.sleep(10)
+
+        fast = MagicMock(async_warm_up=AsyncMock(return_value=True))
+        slow = MagicMock(async_warm_up=sleep)
+
+        start_time = time.monotonic()
+        await async_warm_up(hass, [fast, slow], budget=0.1)
+
+        assert time.monotonic() - start_time < 1
+        fast.async_warm_up.assert_awaited_once_with(["b64:dGVzdDE="])
+
+
+class TestRepeat:
+    @pytest.mark.asyncio
+    async def test_hold_streams_command(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=b"any")
+        mocked_device.emit_ir_stream = MagicMock(return_value=[0.0, 0.1, 0.21])
+
+        instance = OrviboRemote("Test intance", mocked_device)
+        await instance.async_send_command(command=["b64:dGVzdDE="], hold_secs=2)
+
+        mocked_device.emit_ir.assert_not_called()
+        signal, interval, stop, timeout = mocked_device.emit_ir_stream.call_args[0]
+        assert b"test1" == signal
+        assert 2 == timeout
+
+        stats = instance.extra_state_attributes["last_repeat"]
+        assert 3 == stats["count"]
+        assert pytest.approx(10, abs=0.01) == stats["jitter_max_ms"]
+
+    @pytest.mark.asyncio
+    async def test_stop_stream(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+
+        def blocking_stream(signal, interval, stop, timeout, acks=None):
+            assert stop.wait(timeout)
+            return [0.0]
+
+        mocked_device.emit_ir_stream = MagicMock(side_effect=blocking_stream)
+
+        session = DeviceSession(mocked_device)
+        stream = session.start_stream(b"test1", 10, 5)
+
+        assert session.stop_stream()
+        assert 1 == (await stream)["count"]
+        assert not session.stop_stream()
+
+    @pytest.mark.asyncio
+    async def test_stream_rate_is_governed(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+
+        def lossy_stream(signal, interval, stop, timeout, acks=None):
+            # Device keeps up with 8 emits per second only
+            emit_times = [indx * interval for indx in range(int(timeout / interval))]
+            acks.extend(emit_times[: int(timeout * 8)])
+            return emit_times
+
+        mocked_device.emit_ir_stream = MagicMock(side_effect=lossy_stream)
+        session = DeviceSession(mocked_device)
+
+        stats = await session.start_stream(b"test1", 20, 1)
+        assert 8 == stats["acked"]
+        assert 8 == session.governor.rate
+
+        stats = await session.start_stream(b"test1", 20, 1)
+        assert 8 == stats["rate"]
+        assert pytest.approx(8.8) == session.governor.rate
+
+    @pytest.mark.asyncio
+    async def test_streams_dont_starve_commands(self):
+        def blocking_stream(signal, interval, stop, timeout, acks=None):
+            assert stop.wait(timeout)
+            return [0.0]
+
+        sessions = []
+        for indx in range(MAX_WORKERS + 2):
+            device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFF{:02X}".format(indx), type=Orvibo.TYPE_IRDA)
+            device.emit_ir_stream = MagicMock(side_effect=blocking_stream)
+            sessions.append(DeviceSession(device))
+        streams = [session.start_stream(b"test1", 10, 5) for session in sessions]
+
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=True)
+        try:
+            assert await asyncio.wait_for(DeviceSession(mocked_device).async_emit_ir(b"test1"), 1)
+        finally:
+            for session in sessions:
+                session.stop_stream()
+        assert all(1 == stats["count"] for stats in await asyncio.gather(*streams))
+
+
+class TestScheduler:
+    @pytest.mark.asyncio
+    async def test_interactive_first(self):
+        order = []
+
+        async def runner(func, *args):
+            await asyncio.sleep(0.01)
+            return func(*args)
+
+        scheduler = PriorityScheduler(runner, background_interval=0)
+        jobs = [
+            scheduler.async_run(PRIORITY_BACKGROUND, order.append, "background 1"),
+            scheduler.async_run(PRIORITY_BACKGROUND, order.append, "background 2"),
+            scheduler.async_run(PRIORITY_INTERACTIVE, order.append, "interactive"),
+        ]
+        await asyncio.gather(*jobs)
+
+        # First background job is already running when the rest are queued
+        assert ["background 1", "interactive", "background 2"] == order
+        assert 1 == scheduler.stats()["interactive"]["count"]
+
+    @pytest.mark.asyncio
+    async def test_background_rate_limit(self):
+        async def runner(func, *args):
+            return func(*args)
+
+        scheduler = PriorityScheduler(runner, background_interval=0.1)
+        start_time = time.monotonic()
+        await asyncio.gather(
+            *[scheduler.async_run(PRIORITY_BACKGROUND, time.monotonic) for _ in range(3)]
+        )
+
+        assert time.monotonic() - start_time >= 0.2
+
+
+class TestAvailability:
+    @pytest.mark.asyncio
+    async def test_heartbeat_miss_doesnt_block_commands(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=True)
+        mocked_device.subscribe = MagicMock(return_value=None)
+
+        instance = OrviboRemote("Test intance", mocked_device)
+        await instance.async_update()
+        assert instance.available
+
+        await instance.async_send_command(command=["b64:dGVzdDE="])
+        mocked_device.emit_ir.assert_called_once_with(b"test1")
+
+    @pytest.mark.asyncio
+    async def test_unavailable_after_misses_in_a_row(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=True)
+        mocked_device.subscribe = MagicMock(side_effect=[None, None, 1, None, None, None])
+
+        instance = OrviboRemote("Test intance", mocked_device)
+        for _ in range(3):
+            await instance.async_update()
+        assert instance.available
+
+        for _ in range(3):
+            await instance.async_update()
+        assert not instance.available
+
+        await instance.async_send_command(command=["b64:dGVzdDE="])
+        assert instance.available
+
+
+    def test_heartbeat_releases_device_quickly(self, fake_allone):
+        fake = fake_allone("127.0.0.62")
+        device = Orvibo("127.0.0.62", "accf23000062", Orvibo.TYPE_IRDA)
+        session = DeviceSession(device, keep_connection=True)
+        try:
+            # The first heartbeat connects, the next one subscribes again
+            for _ in range(2):
+                start_time = time.monotonic()
+                assert session.heartbeat(BACKGROUND_SUBSCRIBE_TIMEOUT)
+                assert time.monotonic() - start_time < 0.5
+        finally:
+            session.close()
+
+        assert [b"cl", b"cl"] == fake.requests
+
+class TestPower:
+    @pytest.mark.asyncio
+    async def test_redundant_power_on_is_suppressed(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=b"any")
+
+        instance = OrviboRemote(
+            "Test intance",
+            mocked_device,
+            power_on="b64:dGVzdDE=",
+            power_off="b64:dGVzdDI=",
+        )
+        await instance.async_turn_on()
+        await instance.async_turn_on()
+        await instance.async_turn_off()
+
+        assert instance.is_on is False
+        assert 2 == mocked_device.emit_ir.call_count
+        mocked_device.emit_ir.assert_any_call(b"test1")
+        mocked_device.emit_ir.assert_any_call(b"test2")
+
+    @pytest.mark.asyncio
+    async def test_toggle(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=b"any")
+
+        instance = OrviboRemote(
+            "Test intance", mocked_device, power_toggle="b64:dGVzdDM="
+        )
+        await instance.async_turn_off()
+        await instance.async_turn_on()
+        await instance.async_turn_on()
+
+        assert instance.is_on is True
+        mocked_device.emit_ir.assert_called_once_with(b"test3")
+
+    @pytest.mark.asyncio
+    async def test_failed_power_code_keeps_state(self):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(side_effect=[False, True])
+
+        instance = OrviboRemote("Test intance", mocked_device, power_on="b64:dGVzdDE=")
+        with pytest.raises(HomeAssistantError):
+            await instance.async_turn_on()
+        assert instance.is_on is False
+
+        # Failed code is sent again, not suppressed as redundant
+        await instance.async_turn_on()
+        assert instance.is_on is True
+        assert 2 == mocked_device.emit_ir.call_count
+
+
+class TestProfiler:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("mode", [MODE_SAMPLING, MODE_DETERMINISTIC])
+    async def test_profile(self, mode, tmp_path):
+        mocked_device = MockedOrvibo(ip="127.0.0.1", mac="F2FFFFFFFFFF", type=Orvibo.TYPE_IRDA)
+        mocked_device.emit_ir = MagicMock(return_value=b"any")
+        instance = OrviboRemote("Test intance", mocked_device, DeviceSession(mocked_device))
+        decode = OrviboRemote._decode_command
+
+        hass = MagicMock()
+        hass.data = {}
+        hass.config.path = lambda name: str(tmp_path / name)
+        hass.async_add_executor_job = lambda func: asyncio.get_running_loop().run_in_executor(None, func)
+
+        profile = asyncio.ensure_future(async_profile(hass, 0.2, mode))
+        await asyncio.sleep(0.05)
+        await instance.async_send_command(command=["b64:dGVzdDE="])
+        path = await profile
+
+        assert OrviboRemote._decode_command is decode
+        summary = open(path.rsplit(".", 1)[0] + ".txt").read()
+        assert "decode" in summary
+        assert os.path.exists(path)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("mode", [MODE_SAMPLING, MODE_DETERMINISTIC])
+    async def test_cancelled_profile_unhooks(self, mode):
+        hass = MagicMock()
+        hass.data = {}
+        decode = OrviboRemote._decode_command
+
+        profile = asyncio.ensure_future(async_profile(hass, 10, mode))
+        await asyncio.sleep(0.05)
+        profile.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await profile
+
+        assert sys.getprofile() is None
+        assert OrviboRemote._decode_command is decode
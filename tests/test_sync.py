@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+from custom_components.orvibo_remote import sync
+from custom_components.orvibo_remote.orvibo.orvibo import Orvibo
+from custom_components.orvibo_remote.session import DeviceSession
+from custom_components.orvibo_remote.sync import SyncEmitter
+
+
+class TestSynchronizedEmit:
+    def test_burst(self, fake_allone):
+        ips = ["127.0.0.{}".format(indx) for indx in range(10, 20)]
+        fakes = [fake_allone(ip) for ip in ips]
+        emits = [
+            (Orvibo(ip, "accf2300{:04x}".format(indx), Orvibo.TYPE_IRDA), b"signal")
+            for indx, ip in enumerate(ips + ["127.0.0.99"])
+        ]
+        report = Orvibo.emit_ir_synchronized(emits, timeout=0.3)
+
+        assert 10 == report["sent"]
+        assert 10 == report["acked"]
+        assert report["skew_ms"] < 10
+        assert ["127.0.0.99"] == report["failed"]
+        assert all([b"cl", b"ic"] == fake.requests for fake in fakes)
+
+    @pytest.mark.asyncio
+    async def test_gather_emits_of_service_call(self, monkeypatch):
+        bursts = []
+
+        async def emit_synchronized(emits):
+            bursts.append(emits)
+            return {"sent": len(emits), "acked": len(emits), "skew_ms": 0.1, "failed": []}
+
+        monkeypatch.setattr(sync, "async_emit_ir_synchronized", emit_synchronized)
+        emitter = SyncEmitter()
+        sessions = [
+            DeviceSession(Orvibo("127.0.0.{}".format(indx), "accf230000{:02x}".format(indx), Orvibo.TYPE_IRDA))
+            for indx in (2, 3, 4)
+        ]
+
+        reports = await asyncio.gather(
+            emitter.async_emit("call", sessions[0], b"power"),
+            emitter.async_emit("call", sessions[1], b"power"),
+            emitter.async_emit("other call", sessions[2], b"mute"),
+        )
+
+        assert 2 == len(bursts)
+        assert [(sessions[0], b"power"), (sessions[1], b"power")] == bursts[0]
+        assert 2 == reports[0]["sent"] == reports[1]["sent"]
+        assert 1 == reports[2]["sent"]